@@ -0,0 +1,230 @@
+'''
+Bus-level benchmarks of the ST7796 drawing primitives. A fixed set of scenes
+is drawn on an st7796_emu panel that only counts the traffic, and for every
+primitive of every scene the calls, bytes sent, command bytes, CS toggles,
+Python time and heap use are reported as JSON, so runs can be
+compared with each other.
+
+    python benchmark.py [results.json]
+
+Heap use is measured in a second run of each scene so it does not distort
+the times. On MicroPython it is reported as alloc_bytes, the total bytes
+allocated with the collector disabled, which is the pressure on the
+collector. CPython can not count freed allocations, so there it is reported
+as peak_bytes, the peak growth of live memory measured by tracemalloc; short
+lived buffers only show up in alloc_bytes.
+'''
+import sys, time, json, math, gc
+import st7796, st7796_emu
+import kkomi2 as hanfont
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    _ticks_us = time.ticks_us
+    _ticks_diff = time.ticks_diff
+except AttributeError:
+    def _ticks_us():
+        return time.perf_counter_ns() // 1000
+
+    def _ticks_diff(end, start):
+        return end - start
+
+
+class Recorder:
+    '''
+    Run primitives on a display and accumulate their cost per primitive.
+    Args:
+        panel (st7796_emu.Panel): panel the display is wired to
+        measure (str): 'bus' to record calls, bus traffic and time, 'heap'
+            to record heap use only
+    '''
+    def __init__(self, panel, measure):
+        self.panel = panel
+        self.measure = measure
+        self.results = {}
+
+    def call(self, primitive, method, *args):
+        '''
+        Call method(*args) and add its cost to the totals of primitive.
+        '''
+        entry = self.results.get(primitive)
+        if entry is None:
+            entry = self.results[primitive] = {}
+        if self.measure == 'heap':
+            key, value = _allocated(method, args)
+            entry[key] = entry.get(key, 0) + value
+            return
+        panel = self.panel
+        sent = panel.bytes
+        commands = panel.commands
+        transactions = panel.transactions
+        start = _ticks_us()
+        method(*args)
+        elapsed = _ticks_diff(_ticks_us(), start)
+        for key, value in (('calls', 1),
+                           ('bytes', panel.bytes - sent),
+                           ('commands', panel.commands - commands),
+                           ('cs_toggles', panel.transactions - transactions),
+                           ('us', elapsed)):
+            entry[key] = entry.get(key, 0) + value
+
+
+def _allocated(method, args):
+    '''
+    Call method(*args) and return the name and value of its heap
+    measurement, ('peak_bytes', n) with tracemalloc or ('alloc_bytes', n)
+    with gc.mem_alloc.
+    '''
+    if tracemalloc is not None:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        method(*args)
+        return 'peak_bytes', tracemalloc.get_traced_memory()[1] - before
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    method(*args)
+    allocated = gc.mem_alloc() - before
+    gc.enable()
+    return 'alloc_bytes', allocated
+
+
+class RomFont:
+    '''
+    Synthetic 8x16 romfont with the attributes of a converted font module,
+    so text can be measured without a font file.
+    '''
+    WIDTH = 8
+    HEIGHT = 16
+    FIRST = 0x20
+    LAST = 0x80
+    FONT = bytes((n * 73 + 41) & 0xff for n in range((LAST - FIRST) * 16))
+
+
+def fill_scene(rec, display):
+    '''Full screen fills in three colors.'''
+    for color in (st7796.BLACK, st7796.NAVY, st7796.BLACK):
+        rec.call('fill', display.fill, color)
+
+
+def hangul_scene(rec, display):
+    '''The twelve line Hangul color chart of test.py.'''
+    rows = (('white  ', st7796.WHITE), ('yellow ', st7796.YELLOW),
+            ('red    ', st7796.RED), ('green  ', st7796.GREEN),
+            ('blue   ', st7796.BLUE), ('brown  ', st7796.BROWN),
+            ('pink   ', st7796.PINK), ('gold   ', st7796.GOLD),
+            ('aqua   ', st7796.AQUA), ('silver ', st7796.SILVER),
+            ('orange ', st7796.ORANGE), ('olive  ', st7796.OLIVE))
+    for n, (name, color) in enumerate(rows):
+        rec.call('write', display.write, hanfont, name + "월화수목금토일",
+                 0, 26 * n + 1, color, st7796.BLACK)
+
+
+def gauge_scene(rec, display):
+    '''A round gauge redrawn for eleven values, with needle and label.'''
+    x0, y0, radius = 240, 170, 110
+    rec.call('fill_circle', display.fill_circle, x0, y0, radius,
+             st7796.DARKGREY)
+    previous = None
+    for value in range(0, 101, 10):
+        angle = 135 + value * 270 // 100
+        rec.call('arc', display.arc, x0, y0, radius - 4, 135, angle,
+                 st7796.GREEN, 12)
+        if angle < 45 + 360:
+            rec.call('arc', display.arc, x0, y0, radius - 4, angle, 45,
+                     st7796.BLACK, 12)
+        if previous is not None:
+            rec.call('line', display.line, x0, y0, previous[0], previous[1],
+                     st7796.DARKGREY, 3)
+        tip = (x0 + int(80 * math.cos(math.radians(angle))),
+               y0 + int(80 * math.sin(math.radians(angle))))
+        rec.call('line', display.line, x0, y0, tip[0], tip[1],
+                 st7796.RED, 3)
+        previous = tip
+        rec.call('fill_circle', display.fill_circle, x0, y0, 8, st7796.WHITE)
+        label = "%d%%" % value
+        width = display.write_width(hanfont, label)
+        rec.call('fill_rect', display.fill_rect, x0 - 40, y0 + 50, 80,
+                 hanfont.HEIGHT, st7796.DARKGREY)
+        rec.call('write', display.write, hanfont, label, x0 - width // 2,
+                 y0 + 50, st7796.WHITE, st7796.DARKGREY)
+
+
+def text_scene(rec, display):
+    '''Twenty full width lines of 8x16 romfont text in two colors.'''
+    for n in range(20):
+        color = st7796.YELLOW if n & 1 else st7796.WHITE
+        rec.call('text', display.text, RomFont,
+                 "%2d The quick brown fox jumps over the lazy dog, again." % n,
+                 0, 16 * n, color, st7796.BLACK)
+
+
+def polyline_scene(rec, display):
+    '''A 1000 segment polyline over the whole screen, then filled shapes.'''
+    seed = 12345
+    points = []
+    for _ in range(1001):
+        seed = (seed * 1103515245 + 12345) & 0x7fffffff
+        points.append((seed % display.width, (seed >> 12) % display.height))
+    rec.call('polyline', display.polyline, points, st7796.YELLOW)
+    for n in range(0, 1000, 100):
+        x0, y0 = points[n]
+        x1, y1 = points[n + 1]
+        x2, y2 = points[n + 2]
+        rec.call('fill_triangle', display.fill_triangle, x0, y0, x1, y1,
+                 x2, y2, st7796.MAGENTA)
+        rec.call('fill_rect', display.fill_rect, x0 // 2, y0 // 2, 40, 30,
+                 st7796.CYAN)
+
+
+SCENES = (('fill', fill_scene), ('hangul', hangul_scene),
+          ('text', text_scene), ('gauge', gauge_scene),
+          ('polyline', polyline_scene))
+
+
+def _display(panel):
+    display = st7796.ST7796(panel.spi, panel.cs, panel.dc, panel.rst,
+                            320, 480, 1)
+    panel.reset_counters()
+    return display
+
+
+def run():
+    '''
+    Run every scene twice, once for bus traffic and time and once for heap
+    use, and return the results.
+    '''
+    results = {}
+    for name, scene in SCENES:
+        panel = st7796_emu.Panel(decode=False)
+        rec = Recorder(panel, 'bus')
+        scene(rec, _display(panel))
+        if tracemalloc is not None:
+            tracemalloc.start()
+        heap = Recorder(panel, 'heap')
+        scene(heap, _display(panel))
+        if tracemalloc is not None:
+            tracemalloc.stop()
+        total = {}
+        for primitive, entry in rec.results.items():
+            entry.update(heap.results[primitive])
+            for key, value in entry.items():
+                total[key] = total.get(key, 0) + value
+        rec.results['total'] = total
+        results[name] = rec.results
+    return {'implementation': sys.implementation.name,
+            'platform': sys.platform,
+            'scenes': results}
+
+
+if __name__ == '__main__':
+    output = json.dumps(run())
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'w') as f:
+            f.write(output)
+    else:
+        print(output)
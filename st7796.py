@@ -1,6 +1,42 @@
-from machine import Pin, SPI
-import time, struct
-from micropython import const
+try:
+    from machine import Pin, SPI
+except ImportError:  # host side, see st7796_emu
+    Pin = SPI = None
+import time, struct, math
+from st7796_kernels import expand_bytes as _expand_bytes, \
+    expand_bits as _expand_bits, expand_indices as _expand_indices, \
+    expand_indices_bitwise as _expand_indices_bitwise, \
+    replicate as _replicate, bit_runs as _bit_runs, pack444 as _pack444, \
+    pack666 as _pack666
+try:
+    from micropython import const
+except ImportError:
+    def const(value):
+        return value
+try:
+    from time import sleep_ms, ticks_us, ticks_diff
+except ImportError:
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+
+    def ticks_us():
+        return time.perf_counter_ns() // 1000
+
+    def ticks_diff(end, start):
+        return end - start
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        asyncio = None
 
 '''
 ST7796_MISO = 16
@@ -47,6 +83,10 @@ SKYBLUE    = const(0x867D)      # 135, 206, 235
 VIOLET     = const(0x915C)      # 180,  46, 226 
 AQUA       = const(0x07FF)      #   0, 255, 255
 
+# Default palette of IndexedCanvas
+PALETTE16 = (BLACK, WHITE, RED, GREEN, BLUE, YELLOW, CYAN, MAGENTA,
+             ORANGE, PURPLE, NAVY, DARKGREEN, DARKGREY, LIGHTGREY, BROWN, PINK)
+
 # ST7796 specific commands
 ST7796_NOP        = const(0x00)
 ST7796_SWRESET    = const(0x01) #Software Reset
@@ -81,6 +121,8 @@ ST7796_PTLAR      = const(0x30) #Partial Area
 ST7796_VSCRDEF    = const(0x33) #Vertical Scrolling Definition
 ST7796_MADCTL     = const(0x36) #Memory Data Access Control
 ST7796_VSCRSADD   = const(0x37) #Vertical Scroll Start Address of RAM
+ST7796_IDMOFF     = const(0x38) #Idle Mode Off
+ST7796_IDMON      = const(0x39) #Idle Mode On
 ST7796_PIXFMT     = const(0x3A) #Interface Pixel Format (Color Mode)
 
 ST7796_WRDISBV    = const(0x51) #Write Display Brightness
@@ -128,19 +170,24 @@ ST7796_MADCTL_MH  = const(0x04) #Memory Data Access Control
 ST7796_MADCTL_COLOR_ORDER = ST7796_MADCTL_BGR
 
 MEMORY_BUFFER = const(1024) # SPI Write Buffer
+STRIP_BUFFER = const(8192) # Text strip buffer (bytes)
+LUT_CACHE = const(4) # Number of cached 1bpp expansion tables
+DIRTY_RECTS = const(4) # Dirty rectangles kept by a Canvas before merging
+BAND_HEIGHT = const(8) # Rows per band of a BandRenderer
+CONVERT_BUFFER = const(256) # Pixels converted per write in 12 and 18 bit modes
+IMAGE_CHUNK = const(512) # Bytes read from an image file at a time
 
 _ENCODE_PIXEL = ">H"
-_ENCODE_POS = ">HH"
 _DECODE_PIXEL = ">BBB"
 
-_BIT7 = const(0x80)
-_BIT6 = const(0x40)
-_BIT5 = const(0x20)
-_BIT4 = const(0x10)
-_BIT3 = const(0x08)
-_BIT2 = const(0x04)
-_BIT1 = const(0x02)
-_BIT0 = const(0x01)
+_FONT_INDEXES = {}
+
+# Public drawing methods counted by ST7796.set_profiling
+_PROFILED = ('fill_rect', 'vline', 'hline', 'pixel', 'blit_buffer', 'blit_qoi',
+             'rect', 'fill', 'line', 'polyline', 'text', 'bitmap', 'write',
+             'circle', 'fill_circle', 'ellipse', 'fill_ellipse', 'arc', 'pie',
+             'round_rect', 'fill_round_rect', 'triangle', 'fill_triangle',
+             'fill_polygon')
 
 def color565(red, green=0, blue=0):
     '''
@@ -153,238 +200,248 @@ def color565(red, green=0, blue=0):
     return (red & 0xf8) << 8 | (green & 0xfc) << 3 | blue >> 3
 
 
-def _encode_pos(x, y):
-    '''Encode a postion into bytes.'''
-    return struct.pack(_ENCODE_POS, x, y)
-
-
 def _encode_pixel(color):
     '''Encode a pixel color into bytes.'''
     return struct.pack(_ENCODE_PIXEL, color)
 
 
-class ST7796:
-    def __init__(self, spi, cs, dc, rst, w, h, r):
-        self.spi = spi
-        self.cs = cs
-        self.dc = dc
-        self.rst = rst
-        self.init_width = w
-        self.init_height = h
-        self.width = w
-        self.height = h
-        self.rotation = r
-        self.xstart = 0
-        self.ystart = 0
-        self.cs.init(self.cs.OUT, value=1)
-        self.dc.init(self.dc.OUT, value=0)
-        self.rst.init(self.rst.OUT, value=0)
-        self.buffer = bytearray(MEMORY_BUFFER * 2)
-        self.hard_reset()
-        self.soft_reset()
-        self.sleep_mode(False)
-        self._set_color_mode(COLOR_MODE_65K | COLOR_MODE_16BIT)
-        time.sleep_ms(50)
-        self._rotation(self.rotation)
-        self.init()
-        time.sleep_ms(500)
-        self.fill(0)
-
-    def init(self):
-      time.sleep_ms(120)
-      self._write(ST7796_CSCON,b'\xC3') #Enable extension command 2 partI
-      self._write(ST7796_CSCON,b'\x96') #Enable extension command 2 partII
-      
- 
-      self._write(ST7796_INVCTL,b'\x01') #Display Inversion Control
-      self._write(ST7796_EMSET,b'\xC6') #Entry Mode Set
-      self._write(ST7796_PWCTL1,b'\x80\x45') #Power control1 
-      self._write(ST7796_PWCTL2,b'\x13') #Power control2  VAP(GVDD)=3.85+( vcom+vcom offset), VAN(GVCL)=-3.85+( vcom+vcom offset)
-      self._write(ST7796_PWCTL3,b'\xA7') #Power control 3  Source driving current level=low, Gamma driving current level=High
-      self._write(ST7796_VMCTL1,b'\x0A') #VCOM Control VCOM=0.9
-      self._write(ST7796_DTCTLA,b'\x40\x8A\x00\x00\x29\x19\xA5\x33') #Display Output Ctrl Adjust
-      #ST7796 Gamma Sequence
-      self._write(ST7796_GMCTLP1,b'\xD0\x08\x0F\x06\x06\x33\x30/x33\x47\x17\x13\x13\x2B\x31')
-      self._write(ST7796_GMCTLN1,b'\xD0\x0A\x11\x0B\x09\x07\x2F\x33\x47\x38\x15\x16\x2C\x32')
-
-      time.sleep_ms(120)
-      self._write(ST7796_CSCON,b'\xC3')  #Disable extension command 2 partI
-      self._write(ST7796_CSCON,b'\x69')  #Disable extension command 2 partII
-      time.sleep_ms(120)
-      self._write(ST7796_INVON) #Display Inversion On
-      time.sleep_ms(120)
-      self._write(ST7796_DISPON) #Display on
+def _readinto(stream, view):
+    '''
+    Read from stream until view is full or the stream ends, and return the
+    number of bytes read.
+    '''
+    n = 0
+    while n < len(view):
+        count = stream.readinto(view[n:])
+        if not count:
+            break
+        n += count
+    return n
 
-    # This is the command sequence that rotates the ST7796 driver coordinate frame
-    def _rotation(self, m):
-      rotation = m % 8 # Limit the range of values to 0-7
-      self._write(ST7796_MADCTL)
-      if rotation == 0:  # 0 deg
-          self._writedata(bytearray([ST7796_MADCTL_MX | ST7796_MADCTL_COLOR_ORDER]))
-          self.width  = self.init_width
-          self.height = self.init_height
-      elif rotation == 1: # 90 deg
-          self._writedata(bytearray([ST7796_MADCTL_MV | ST7796_MADCTL_COLOR_ORDER]))
-          self.width  = self.init_height
-          self.height = self.init_width
-      elif rotation == 2: # 180 deg
-          self._writedata(bytearray([ST7796_MADCTL_MY | ST7796_MADCTL_COLOR_ORDER]))
-          self.width  = self.init_width
-          self.height = self.init_height
-      elif rotation == 3: # 270 deg
-          self._writedata(bytearray([ST7796_MADCTL_MX | ST7796_MADCTL_MY | ST7796_MADCTL_MV | ST7796_MADCTL_COLOR_ORDER]))
-          self.width  = self.init_height
-          self.height = self.init_width
-      # These next rotations are for bottom up BMP drawing
-      elif rotation == 4: # Mirrored + 0 deg
-          self._writedata(bytearray([ST7796_MADCTL_MX | ST7796_MADCTL_MY | ST7796_MADCTL_COLOR_ORDER]))
-          self.width  = self.init_width
-          self.height = self.init_height
-      elif rotation == 5: # Mirrored + 90 deg
-          self._writedata(bytearray([ST7796_MADCTL_MV | ST7796_MADCTL_MX | ST7796_MADCTL_COLOR_ORDER]))
-          self.width  = self.init_height
-          self.height = self.init_width
-      elif rotation == 6: # Mirrored + 180 deg
-          self._writedata(bytearray([ST7796_MADCTL_COLOR_ORDER]))
-          self.width  = self.init_width
-          self.height = self.init_height
-      elif rotation == 7: # Mirrored + 270 deg
-          self._writedata(bytearray([ST7796_MADCTL_MY | ST7796_MADCTL_MV | ST7796_MADCTL_COLOR_ORDER]))
-          self.width  = self.init_height
-          self.height = self.init_width
-      else:
-          self._writedata(bytearray([ST7796_MADCTL_COLOR_ORDER]))
 
+def _build_lut(table, fg, bg):
+    '''
+    Fill a 4096 byte table that expands one 1bpp source byte into eight
+    big-endian RGB565 pixels (16 bytes), most significant bit first.
+    '''
+    nibbles = bytearray(128)
+    i = 0
+    for nibble in range(16):
+        mask = 0x08
+        while mask:
+            color = fg if nibble & mask else bg
+            nibbles[i] = color >> 8
+            nibbles[i + 1] = color & 0xff
+            i += 2
+            mask >>= 1
+    i = 0
+    for byte in range(256):
+        hi = (byte >> 4) << 3
+        lo = (byte & 0x0f) << 3
+        table[i:i + 8] = nibbles[hi:hi + 8]
+        table[i + 8:i + 16] = nibbles[lo:lo + 8]
+        i += 16
+
+
+def _build_palette_lut(table, palette, bpp):
+    '''
+    Fill a table that expands one byte of 2, 4 or 8 bpp palette indexes into
+    8 // bpp big-endian RGB565 pixels (16 // bpp bytes), most significant
+    index first. Indexes beyond the end of palette expand to black.
+    '''
+    mask = (1 << bpp) - 1
+    colors = bytearray(2 << bpp)
+    for n, color in enumerate(palette[0:mask + 1]):
+        colors[n * 2] = color >> 8
+        colors[n * 2 + 1] = color & 0xff
+    i = 0
+    for byte in range(256):
+        for shift in range(8 - bpp, -1, -bpp):
+            e = ((byte >> shift) & mask) * 2
+            table[i] = colors[e]
+            table[i + 1] = colors[e + 1]
+            i += 2
+
+
+def _ellipse_extents(rx, ry):
+    '''
+    Return the half width of every row of a filled ellipse with radii rx and
+    ry, from the center row outwards. A pixel belongs to the ellipse when its
+    center lies inside the ellipse with radii rx + 0.5 and ry + 0.5.
+    '''
+    a = (2 * rx + 1) * (2 * rx + 1)
+    b = (2 * ry + 1) * (2 * ry + 1)
+    ab = a * b
+    extents = []
+    x = rx
+    for y in range(ry + 1):
+        ya = 4 * y * y * a
+        while x > 0 and 4 * x * x * b + ya > ab:
+            x -= 1
+        extents.append(x)
+    return extents
+
+
+def _ring_extents(outer, rx, ry, thickness):
+    '''
+    Return the smallest half width of every row of an ellipse outline with
+    the given outer extents, 0 where the row is a single span. One pixel
+    outlines close each row up to the next row's extent so they stay
+    connected.
+    '''
+    if thickness == 1:
+        inner = [min(outer[y + 1] + 1, outer[y]) for y in range(ry)]
+        inner.append(0)
+        return inner
+    inner = [0] * (ry + 1)
+    if rx >= thickness and ry >= thickness:
+        hole = _ellipse_extents(rx - thickness, ry - thickness)
+        for y in range(len(hole)):
+            inner[y] = min(hole[y] + 1, outer[y])
+    return inner
+
+
+def _round_div(p, q):
+    '''
+    Return p / q rounded to the nearest integer, q > 0.
+    '''
+    return (2 * p + q) // (2 * q)
 
-    def hard_reset(self):
-        ''' Hard reset display. '''
-        self.cs.off()
-        self.rst.on()
-        time.sleep_ms(50)
-        self.rst.off()
-        time.sleep_ms(50)
-        self.rst.on()
-        time.sleep_ms(150)
-        self.cs.on()
 
-    def soft_reset(self):
-        ''' Soft reset display. '''
-        self._write(ST7796_SWRESET)
-        time.sleep_ms(150)
+def _half_plane(k, m):
+    '''
+    Return the integer interval of x satisfying k * x <= m.
+    '''
+    if k > 1e-9:
+        return (-0x7fff, math.floor(m / k + 1e-6))
+    if k < -1e-9:
+        return (math.ceil(m / k - 1e-6), 0x7fff)
+    if m >= -1e-9:
+        return (-0x7fff, 0x7fff)
+    return (0x7fff, -0x7fff)
 
-    def sleep_mode(self, value):
-        '''
-        Enable or disable display sleep mode.
-        Args:
-            value (bool): if True enable sleep mode. if False disable sleep
-            mode
-        '''
-        if value:
-            self._write(ST7796_SLPIN)
-        else:
-            self._write(ST7796_SLPOUT)
 
+def _sector(start, end):
+    '''
+    Return the boundary directions of the sector swept clockwise from start
+    to end degrees, 0 being 3 o'clock, or None for a full circle.
+    '''
+    if end - start >= 360:
+        return None
+    a0 = math.radians(start)
+    a1 = math.radians(end)
+    return (math.sin(a0), math.cos(a0), math.sin(a1), math.cos(a1),
+            (end - start) % 360 > 180)
 
-    def inversion_mode(self, value):
-        '''
-        Enable or disable display inversion mode.
-        Args:
-            value (bool): if True enable inversion mode. if False disable
-            inversion mode
-        '''
-        if value:
-            self._write(ST7796_INVON)
-        else:
-            self._write(ST7796_INVOFF)
 
-    def _set_color_mode(self, mode):
+def _sector_row(sector, y):
+    '''
+    Return the x intervals of row y, relative to the center, that lie inside
+    a sector from _sector.
+    '''
+    s0, c0, s1, c1, wide = sector
+    lo0, hi0 = _half_plane(s0, c0 * y)
+    lo1, hi1 = _half_plane(-s1, -c1 * y)
+    if not wide:
+        return ((max(lo0, lo1), min(hi0, hi1)),)
+    if lo0 > lo1:
+        lo0, hi0, lo1, hi1 = lo1, hi1, lo0, hi0
+    if lo1 <= hi0 + 1:
+        return ((lo0, max(hi0, hi1)),)
+    return ((lo0, hi0), (lo1, hi1))
+
+
+def _font_index(font):
+    '''
+    Return a dict mapping codepoints to glyph indexes for a converted
+    true-type font. A precomputed font.INDEX is used as is, otherwise the
+    index is built from font.MAP once per font module and cached.
+    '''
+    index = _FONT_INDEXES.get(font)
+    if index is None:
+        try:
+            index = font.INDEX
+        except AttributeError:
+            index = {}
+            for char_index, character in enumerate(font.MAP):
+                index.setdefault(ord(character), char_index)
+        _FONT_INDEXES[font] = index
+    return index
+
+
+class GlyphCache:
+    '''
+    LRU cache of rendered RGB565 glyphs keyed by (font, glyph, fg, bg), or
+    of sprite frames keyed by (bitmap, index), bounded by a budget of pixel
+    bytes. Entries live in a plain dict with the use count of their last
+    hit, so a hit costs one lookup; only an eviction scans for the oldest
+    count.
+    '''
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._glyphs = {}
+        self._uses = 0
+
+    def get(self, key):
         '''
-        Set display color mode.
-        Args:
-            mode (int): color mode
-                COLOR_MODE_65K, COLOR_MODE_262K, COLOR_MODE_12BIT,
-                COLOR_MODE_16BIT, COLOR_MODE_18BIT, COLOR_MODE_16M
+        Return the rendered glyph for key and mark it as most recently used,
+        or None if it is not cached.
         '''
-        self._write(ST7796_PIXFMT, bytes([mode & 0x77]))
-
-    def SetPosition(self,x,y):
-        self.xstart,self.ystart = x,y
-
-    def _write(self, command, data=None):
-        self.dc.off()
-        self.cs.off()
-        self.spi.write(bytearray([command]))
-        self.cs.on()
-        if data is not None:
-            self._writedata(data)
-
-    def _writedata(self, data):
-        self.dc.on()
-        self.cs.off()
-        self.spi.write(data)
-        self.cs.on()
-
-    def WriteBlock(self, x0, y0, x1, y1, data=None):
-        self._write(ST7796_CASET, struct.pack(">HH", x0, x1))
-        self._write(ST7796_RASET, struct.pack(">HH", y0, y1))
-        self._write(ST7796_RAMWR, data)
-
-    def fill_rect(self, x, y, width, height, color):
+        entry = self._glyphs.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._uses += 1
+        entry[1] = self._uses
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, glyph):
         '''
-        Draw a rectangle at the given location, size and filled with color.
-        Args:
-            x (int): Top left corner x coordinate
-            y (int): Top left corner y coordinate
-            width (int): Width in pixels
-            height (int): Height in pixels
-            color (int): 565 encoded color
+        Store a rendered glyph, evicting least recently used glyphs until it
+        fits the budget. Glyphs larger than the whole budget are not kept.
         '''
-        self._set_window(x, y, x + width - 1, y + height - 1)
-        chunks, rest = divmod(width * height, MEMORY_BUFFER)
-        pixel = _encode_pixel(color)
-        self.dc.on()
-        if chunks:
-            data = pixel * MEMORY_BUFFER
-            for _ in range(chunks):
-                self._writedata(data)
-        if rest:
-            self._writedata(pixel * rest)
-  
-    def _set_columns(self, start, end):
+        size = len(glyph)
+        if size > self.budget:
+            return
+        glyphs = self._glyphs
+        entry = glyphs.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+        while self.size + size > self.budget:
+            oldest = None
+            for k, entry in glyphs.items():
+                if oldest is None or entry[1] < uses:
+                    oldest = k
+                    uses = entry[1]
+            self.size -= len(glyphs.pop(oldest)[0])
+        self._uses += 1
+        glyphs[key] = [glyph, self._uses]
+        self.size += size
+
+    def clear(self):
         '''
-        Send CASET (column address set) command to display.
-        Args:
-            start (int): column start address
-            end (int): column end address
+        Drop all cached glyphs and reset the hit and miss counters.
         '''
-        if start <= end <= self.width:
-            self._write(ST7796_CASET, _encode_pos(
-                start+self.xstart, end + self.xstart))
+        self._glyphs = {}
+        self._uses = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
 
-    def _set_rows(self, start, end):
-        '''
-        Send RASET (row address set) command to display.
-        Args:
-            start (int): row start address
-            end (int): row end address
-       '''
-        if start <= end <= self.height:
-            self._write(ST7796_RASET, _encode_pos(
-                start+self.ystart, end+self.ystart))
 
-    def _set_window(self, x0, y0, x1, y1):
-        '''
-        Set window to column and row address.
-        Args:
-            x0 (int): column start address
-            y0 (int): row start address
-            x1 (int): column end address
-            y1 (int): row end address
-        '''
-        self._set_columns(x0, x1)
-        self._set_rows(y0, y1)
-        self._write(ST7796_RAMWR)
-    
+class Graphics:
+    '''
+    Drawing primitives shared by the display driver and the off-screen
+    canvases. Everything is drawn through three methods of the subclass:
+    fill_rect, _set_window, which starts a window of pixel data, and
+    _writepixels, which sends big-endian RGB565 pixels to it. Subclasses
+    also provide width, height, _strip, _luts, glyph_cache and
+    sprite_cache.
+    '''
     def vline(self, x, y, length, color):
         '''
         Draw vertical line at the given location and color.
@@ -416,9 +473,9 @@ class ST7796:
             color (int): 565 encoded color
         '''
         self._set_window(x, y, x, y)
-        self._writedata(_encode_pixel(color))
-    
-    def blit_buffer(self, buffer, x, y, width, height):
+        self._writepixels(_encode_pixel(color))
+
+    def blit_buffer(self, buffer, x, y, width, height, stride=0):
         '''
         Copy buffer to display at the given location.
         Args:
@@ -427,9 +484,113 @@ class ST7796:
             Y (int): Top left corner y coordinate
             width (int): Width
             height (int): Height
+            stride (int): bytes per row of buffer when it is wider than the
+                copied area, optional, defaults to width * 2
+        '''
+        self._set_window(x, y, x + width - 1, y + height - 1)
+        row_bytes = width * 2
+        if not stride or stride == row_bytes:
+            self._writepixels(buffer)
+            return
+        view = memoryview(buffer)
+        for i in range(0, height * stride, stride):
+            self._writepixels(view[i:i + row_bytes])
+
+    def blit_qoi(self, source, x, y):
+        '''
+        Draw a QOI image, streaming it from a file. The file is read
+        IMAGE_CHUNK bytes at a time and decoded one row at a time, so memory
+        use depends only on the image width. Alpha is ignored.
+        Args:
+            source (str or file): file name, or a file opened in binary mode
+            x (int): Top left corner x coordinate
+            y (int): Top left corner y coordinate
+        '''
+        stream = open(source, "rb") if isinstance(source, str) else source
+        try:
+            self._blit_qoi(stream, x, y)
+        finally:
+            if stream is not source:
+                stream.close()
+
+    def _blit_qoi(self, stream, x, y):
+        '''
+        Decode a QOI stream into RGB565 rows and send them to one window.
+        Args:
+            stream (file): QOI data, positioned at the header
+            x (int): Top left corner x coordinate
+            y (int): Top left corner y coordinate
         '''
+        chunk = bytearray(IMAGE_CHUNK)
+        view = memoryview(chunk)
+        if _readinto(stream, view[0:14]) != 14 or chunk[0:4] != b"qoif":
+            raise ValueError("not a QOI image")
+        width, height = struct.unpack(">II", chunk[4:12])
+        row_bytes = width * 2
+        line = bytearray(row_bytes)
+        index = bytearray(256)
+        r = g = b = 0
+        a = 255
+        hi = lo = 0
+        run = 0
+        pos = end = 0
         self._set_window(x, y, x + width - 1, y + height - 1)
-        self._writedata(buffer)
+        for _ in range(height):
+            i = 0
+            while i < row_bytes:
+                if run:
+                    run -= 1
+                else:
+                    if end - pos < 5:
+                        chunk[0:end - pos] = chunk[pos:end]
+                        end -= pos
+                        pos = 0
+                        end += _readinto(stream, view[end:])
+                        if end == 0:
+                            raise ValueError("truncated QOI image")
+                    op = chunk[pos]
+                    pos += 1
+                    if op == 0xfe:
+                        r = chunk[pos]
+                        g = chunk[pos + 1]
+                        b = chunk[pos + 2]
+                        pos += 3
+                    elif op == 0xff:
+                        r = chunk[pos]
+                        g = chunk[pos + 1]
+                        b = chunk[pos + 2]
+                        a = chunk[pos + 3]
+                        pos += 4
+                    elif op < 0x40:
+                        k = op * 4
+                        r = index[k]
+                        g = index[k + 1]
+                        b = index[k + 2]
+                        a = index[k + 3]
+                    elif op < 0x80:
+                        r = (r + ((op >> 4) & 3) - 2) & 0xff
+                        g = (g + ((op >> 2) & 3) - 2) & 0xff
+                        b = (b + (op & 3) - 2) & 0xff
+                    elif op < 0xc0:
+                        dg = (op & 0x3f) - 32
+                        op = chunk[pos]
+                        pos += 1
+                        r = (r + dg - 8 + (op >> 4)) & 0xff
+                        g = (g + dg) & 0xff
+                        b = (b + dg - 8 + (op & 0x0f)) & 0xff
+                    else:
+                        run = op & 0x3f
+                    k = ((r * 3 + g * 5 + b * 7 + a * 11) & 0x3f) * 4
+                    index[k] = r
+                    index[k + 1] = g
+                    index[k + 2] = b
+                    index[k + 3] = a
+                    hi = (r & 0xf8) | g >> 5
+                    lo = (g << 3) & 0xe0 | b >> 3
+                line[i] = hi
+                line[i + 1] = lo
+                i += 2
+            self._writepixels(line)
 
     def rect(self, x, y, w, h, color):
         '''
@@ -454,16 +615,31 @@ class ST7796:
         '''
         self.fill_rect(0, 0, self.width, self.height, color)
 
-    def line(self, x0, y0, x1, y1, color):
+    def line(self, x0, y0, x1, y1, color, thickness=1):
         '''
-        Draw a single pixel wide line starting at x0, y0 and ending at x1, y1.
+        Draw a line starting at x0, y0 and ending at x1, y1. Consecutive
+        Bresenham pixels on the same row, or on the same column for steep
+        lines, are sent as a single span.
         Args:
             x0 (int): Start point x coordinate
             y0 (int): Start point y coordinate
             x1 (int): End point x coordinate
             y1 (int): End point y coordinate
             color (int): 565 encoded color
+            thickness (int): line thickness in pixels, optional, defaults to 1
         '''
+        half = thickness // 2
+        if y0 == y1:
+            if x0 > x1:
+                x0, x1 = x1, x0
+            self.fill_rect(x0, y0 - half, x1 - x0 + 1, thickness, color)
+            return
+        if x0 == x1:
+            if y0 > y1:
+                y0, y1 = y1, y0
+            self.fill_rect(x0 - half, y0, thickness, y1 - y0 + 1, color)
+            return
+
         steep = abs(y1 - y0) > abs(x1 - x0)
         if steep:
             x0, y0 = y0, x0
@@ -478,285 +654,78 @@ class ST7796:
             ystep = 1
         else:
             ystep = -1
+        if thickness > 1:
+            # Runs are widened along the minor axis, so scale the thickness
+            # to keep it constant across the line.
+            thickness = int(thickness * math.sqrt(dx * dx + dy * dy) / dx + 0.5)
+            half = thickness // 2
+
+        start = x0
         while x0 <= x1:
-            if steep:
-                self.pixel(y0, x0, color)
-            else:
-                self.pixel(x0, y0, color)
             err -= dy
-            if err < 0:
-                y0 += ystep
-                err += dx
+            if err < 0 or x0 == x1:
+                if steep:
+                    self.fill_rect(
+                        y0 - half, start, thickness, x0 - start + 1, color)
+                else:
+                    self.fill_rect(
+                        start, y0 - half, x0 - start + 1, thickness, color)
+                start = x0 + 1
+                if err < 0:
+                    y0 += ystep
+                    err += dx
             x0 += 1
 
-
-    def _text8(self, font, text, x0, y0, color=WHITE, background=BLACK):
+    def polyline(self, points, color, thickness=1):
         '''
-        Internal method to write characters with width of 8 and
-        heights of 8 or 16.
+        Draw connected lines through a sequence of points.
         Args:
-            font (module): font module to use
-            text (str): text to write
-            x0 (int): column to start drawing at
-            y0 (int): row to start drawing at
-            color (int): 565 encoded color to use for characters
-            background (int): 565 encoded color to use for background
+            points (list): (x, y) tuples of the vertices in drawing order
+            color (int): 565 encoded color
+            thickness (int): line thickness in pixels, optional, defaults to 1
         '''
-        for char in text:
-            ch = ord(char)
-            if (font.FIRST <= ch < font.LAST
-                    and x0+font.WIDTH <= self.width
-                    and y0+font.HEIGHT <= self.height):
-
-                if font.HEIGHT == 8:
-                    passes = 1
-                    size = 8
-                    each = 0
-                else:
-                    passes = 2
-                    size = 16
-                    each = 8
-
-                for line in range(passes):
-                    idx = (ch-font.FIRST)*size+(each*line)
-                    buffer = struct.pack(
-                        '>64H',
-                        color if font.FONT[idx] & _BIT7 else background,
-                        color if font.FONT[idx] & _BIT6 else background,
-                        color if font.FONT[idx] & _BIT5 else background,
-                        color if font.FONT[idx] & _BIT4 else background,
-                        color if font.FONT[idx] & _BIT3 else background,
-                        color if font.FONT[idx] & _BIT2 else background,
-                        color if font.FONT[idx] & _BIT1 else background,
-                        color if font.FONT[idx] & _BIT0 else background,
-                        color if font.FONT[idx+1] & _BIT7 else background,
-                        color if font.FONT[idx+1] & _BIT6 else background,
-                        color if font.FONT[idx+1] & _BIT5 else background,
-                        color if font.FONT[idx+1] & _BIT4 else background,
-                        color if font.FONT[idx+1] & _BIT3 else background,
-                        color if font.FONT[idx+1] & _BIT2 else background,
-                        color if font.FONT[idx+1] & _BIT1 else background,
-                        color if font.FONT[idx+1] & _BIT0 else background,
-                        color if font.FONT[idx+2] & _BIT7 else background,
-                        color if font.FONT[idx+2] & _BIT6 else background,
-                        color if font.FONT[idx+2] & _BIT5 else background,
-                        color if font.FONT[idx+2] & _BIT4 else background,
-                        color if font.FONT[idx+2] & _BIT3 else background,
-                        color if font.FONT[idx+2] & _BIT2 else background,
-                        color if font.FONT[idx+2] & _BIT1 else background,
-                        color if font.FONT[idx+2] & _BIT0 else background,
-                        color if font.FONT[idx+3] & _BIT7 else background,
-                        color if font.FONT[idx+3] & _BIT6 else background,
-                        color if font.FONT[idx+3] & _BIT5 else background,
-                        color if font.FONT[idx+3] & _BIT4 else background,
-                        color if font.FONT[idx+3] & _BIT3 else background,
-                        color if font.FONT[idx+3] & _BIT2 else background,
-                        color if font.FONT[idx+3] & _BIT1 else background,
-                        color if font.FONT[idx+3] & _BIT0 else background,
-                        color if font.FONT[idx+4] & _BIT7 else background,
-                        color if font.FONT[idx+4] & _BIT6 else background,
-                        color if font.FONT[idx+4] & _BIT5 else background,
-                        color if font.FONT[idx+4] & _BIT4 else background,
-                        color if font.FONT[idx+4] & _BIT3 else background,
-                        color if font.FONT[idx+4] & _BIT2 else background,
-                        color if font.FONT[idx+4] & _BIT1 else background,
-                        color if font.FONT[idx+4] & _BIT0 else background,
-                        color if font.FONT[idx+5] & _BIT7 else background,
-                        color if font.FONT[idx+5] & _BIT6 else background,
-                        color if font.FONT[idx+5] & _BIT5 else background,
-                        color if font.FONT[idx+5] & _BIT4 else background,
-                        color if font.FONT[idx+5] & _BIT3 else background,
-                        color if font.FONT[idx+5] & _BIT2 else background,
-                        color if font.FONT[idx+5] & _BIT1 else background,
-                        color if font.FONT[idx+5] & _BIT0 else background,
-                        color if font.FONT[idx+6] & _BIT7 else background,
-                        color if font.FONT[idx+6] & _BIT6 else background,
-                        color if font.FONT[idx+6] & _BIT5 else background,
-                        color if font.FONT[idx+6] & _BIT4 else background,
-                        color if font.FONT[idx+6] & _BIT3 else background,
-                        color if font.FONT[idx+6] & _BIT2 else background,
-                        color if font.FONT[idx+6] & _BIT1 else background,
-                        color if font.FONT[idx+6] & _BIT0 else background,
-                        color if font.FONT[idx+7] & _BIT7 else background,
-                        color if font.FONT[idx+7] & _BIT6 else background,
-                        color if font.FONT[idx+7] & _BIT5 else background,
-                        color if font.FONT[idx+7] & _BIT4 else background,
-                        color if font.FONT[idx+7] & _BIT3 else background,
-                        color if font.FONT[idx+7] & _BIT2 else background,
-                        color if font.FONT[idx+7] & _BIT1 else background,
-                        color if font.FONT[idx+7] & _BIT0 else background
-                    )
-                    self.blit_buffer(buffer, x0, y0+8*line, 8, 8)
-
-                x0 += 8
-
-    def _text16(self, font, text, x0, y0, color=WHITE, background=BLACK):
-        '''
-        Internal method to draw characters with width of 16 and heights of 16
-        or 32.
+        x0, y0 = points[0]
+        for n in range(1, len(points)):
+            x1, y1 = points[n]
+            self.line(x0, y0, x1, y1, color, thickness)
+            x0, y0 = x1, y1
+
+    def _text_run(self, font, glyphs, x, y, lut):
+        '''
+        Render a run of romfont glyphs side by side into the strip buffer
+        and send it to the display as a single window.
         Args:
             font (module): font module to use
-            text (str): text to write
-            x0 (int): column to start drawing at
-            y0 (int): row to start drawing at
-            color (int): 565 encoded color to use for characters
-            background (int): 565 encoded color to use for background
+            glyphs (list): offsets of each glyph of the run in font.FONT
+            x (int): column of the first glyph
+            y (int): row of the run
+            lut (memoryview): expansion table from _lut
         '''
-        for char in text:
-            ch = ord(char)
-            if (font.FIRST <= ch < font.LAST
-                    and x0+font.WIDTH <= self.width
-                    and y0+font.HEIGHT <= self.height):
-
-                if font.HEIGHT == 16:
-                    passes = 2
-                    size = 32
-                    each = 16
-                else:
-                    passes = 4
-                    size = 64
-                    each = 16
-
-                for line in range(passes):
-                    idx = (ch-font.FIRST)*size+(each*line)
-                    buffer = struct.pack(
-                        '>128H',
-                        color if font.FONT[idx] & _BIT7 else background,
-                        color if font.FONT[idx] & _BIT6 else background,
-                        color if font.FONT[idx] & _BIT5 else background,
-                        color if font.FONT[idx] & _BIT4 else background,
-                        color if font.FONT[idx] & _BIT3 else background,
-                        color if font.FONT[idx] & _BIT2 else background,
-                        color if font.FONT[idx] & _BIT1 else background,
-                        color if font.FONT[idx] & _BIT0 else background,
-                        color if font.FONT[idx+1] & _BIT7 else background,
-                        color if font.FONT[idx+1] & _BIT6 else background,
-                        color if font.FONT[idx+1] & _BIT5 else background,
-                        color if font.FONT[idx+1] & _BIT4 else background,
-                        color if font.FONT[idx+1] & _BIT3 else background,
-                        color if font.FONT[idx+1] & _BIT2 else background,
-                        color if font.FONT[idx+1] & _BIT1 else background,
-                        color if font.FONT[idx+1] & _BIT0 else background,
-                        color if font.FONT[idx+2] & _BIT7 else background,
-                        color if font.FONT[idx+2] & _BIT6 else background,
-                        color if font.FONT[idx+2] & _BIT5 else background,
-                        color if font.FONT[idx+2] & _BIT4 else background,
-                        color if font.FONT[idx+2] & _BIT3 else background,
-                        color if font.FONT[idx+2] & _BIT2 else background,
-                        color if font.FONT[idx+2] & _BIT1 else background,
-                        color if font.FONT[idx+2] & _BIT0 else background,
-                        color if font.FONT[idx+3] & _BIT7 else background,
-                        color if font.FONT[idx+3] & _BIT6 else background,
-                        color if font.FONT[idx+3] & _BIT5 else background,
-                        color if font.FONT[idx+3] & _BIT4 else background,
-                        color if font.FONT[idx+3] & _BIT3 else background,
-                        color if font.FONT[idx+3] & _BIT2 else background,
-                        color if font.FONT[idx+3] & _BIT1 else background,
-                        color if font.FONT[idx+3] & _BIT0 else background,
-                        color if font.FONT[idx+4] & _BIT7 else background,
-                        color if font.FONT[idx+4] & _BIT6 else background,
-                        color if font.FONT[idx+4] & _BIT5 else background,
-                        color if font.FONT[idx+4] & _BIT4 else background,
-                        color if font.FONT[idx+4] & _BIT3 else background,
-                        color if font.FONT[idx+4] & _BIT2 else background,
-                        color if font.FONT[idx+4] & _BIT1 else background,
-                        color if font.FONT[idx+4] & _BIT0 else background,
-                        color if font.FONT[idx+5] & _BIT7 else background,
-                        color if font.FONT[idx+5] & _BIT6 else background,
-                        color if font.FONT[idx+5] & _BIT5 else background,
-                        color if font.FONT[idx+5] & _BIT4 else background,
-                        color if font.FONT[idx+5] & _BIT3 else background,
-                        color if font.FONT[idx+5] & _BIT2 else background,
-                        color if font.FONT[idx+5] & _BIT1 else background,
-                        color if font.FONT[idx+5] & _BIT0 else background,
-                        color if font.FONT[idx+6] & _BIT7 else background,
-                        color if font.FONT[idx+6] & _BIT6 else background,
-                        color if font.FONT[idx+6] & _BIT5 else background,
-                        color if font.FONT[idx+6] & _BIT4 else background,
-                        color if font.FONT[idx+6] & _BIT3 else background,
-                        color if font.FONT[idx+6] & _BIT2 else background,
-                        color if font.FONT[idx+6] & _BIT1 else background,
-                        color if font.FONT[idx+6] & _BIT0 else background,
-                        color if font.FONT[idx+7] & _BIT7 else background,
-                        color if font.FONT[idx+7] & _BIT6 else background,
-                        color if font.FONT[idx+7] & _BIT5 else background,
-                        color if font.FONT[idx+7] & _BIT4 else background,
-                        color if font.FONT[idx+7] & _BIT3 else background,
-                        color if font.FONT[idx+7] & _BIT2 else background,
-                        color if font.FONT[idx+7] & _BIT1 else background,
-                        color if font.FONT[idx+7] & _BIT0 else background,
-                        color if font.FONT[idx+8] & _BIT7 else background,
-                        color if font.FONT[idx+8] & _BIT6 else background,
-                        color if font.FONT[idx+8] & _BIT5 else background,
-                        color if font.FONT[idx+8] & _BIT4 else background,
-                        color if font.FONT[idx+8] & _BIT3 else background,
-                        color if font.FONT[idx+8] & _BIT2 else background,
-                        color if font.FONT[idx+8] & _BIT1 else background,
-                        color if font.FONT[idx+8] & _BIT0 else background,
-                        color if font.FONT[idx+9] & _BIT7 else background,
-                        color if font.FONT[idx+9] & _BIT6 else background,
-                        color if font.FONT[idx+9] & _BIT5 else background,
-                        color if font.FONT[idx+9] & _BIT4 else background,
-                        color if font.FONT[idx+9] & _BIT3 else background,
-                        color if font.FONT[idx+9] & _BIT2 else background,
-                        color if font.FONT[idx+9] & _BIT1 else background,
-                        color if font.FONT[idx+9] & _BIT0 else background,
-                        color if font.FONT[idx+10] & _BIT7 else background,
-                        color if font.FONT[idx+10] & _BIT6 else background,
-                        color if font.FONT[idx+10] & _BIT5 else background,
-                        color if font.FONT[idx+10] & _BIT4 else background,
-                        color if font.FONT[idx+10] & _BIT3 else background,
-                        color if font.FONT[idx+10] & _BIT2 else background,
-                        color if font.FONT[idx+10] & _BIT1 else background,
-                        color if font.FONT[idx+10] & _BIT0 else background,
-                        color if font.FONT[idx+11] & _BIT7 else background,
-                        color if font.FONT[idx+11] & _BIT6 else background,
-                        color if font.FONT[idx+11] & _BIT5 else background,
-                        color if font.FONT[idx+11] & _BIT4 else background,
-                        color if font.FONT[idx+11] & _BIT3 else background,
-                        color if font.FONT[idx+11] & _BIT2 else background,
-                        color if font.FONT[idx+11] & _BIT1 else background,
-                        color if font.FONT[idx+11] & _BIT0 else background,
-                        color if font.FONT[idx+12] & _BIT7 else background,
-                        color if font.FONT[idx+12] & _BIT6 else background,
-                        color if font.FONT[idx+12] & _BIT5 else background,
-                        color if font.FONT[idx+12] & _BIT4 else background,
-                        color if font.FONT[idx+12] & _BIT3 else background,
-                        color if font.FONT[idx+12] & _BIT2 else background,
-                        color if font.FONT[idx+12] & _BIT1 else background,
-                        color if font.FONT[idx+12] & _BIT0 else background,
-                        color if font.FONT[idx+13] & _BIT7 else background,
-                        color if font.FONT[idx+13] & _BIT6 else background,
-                        color if font.FONT[idx+13] & _BIT5 else background,
-                        color if font.FONT[idx+13] & _BIT4 else background,
-                        color if font.FONT[idx+13] & _BIT3 else background,
-                        color if font.FONT[idx+13] & _BIT2 else background,
-                        color if font.FONT[idx+13] & _BIT1 else background,
-                        color if font.FONT[idx+13] & _BIT0 else background,
-                        color if font.FONT[idx+14] & _BIT7 else background,
-                        color if font.FONT[idx+14] & _BIT6 else background,
-                        color if font.FONT[idx+14] & _BIT5 else background,
-                        color if font.FONT[idx+14] & _BIT4 else background,
-                        color if font.FONT[idx+14] & _BIT3 else background,
-                        color if font.FONT[idx+14] & _BIT2 else background,
-                        color if font.FONT[idx+14] & _BIT1 else background,
-                        color if font.FONT[idx+14] & _BIT0 else background,
-                        color if font.FONT[idx+15] & _BIT7 else background,
-                        color if font.FONT[idx+15] & _BIT6 else background,
-                        color if font.FONT[idx+15] & _BIT5 else background,
-                        color if font.FONT[idx+15] & _BIT4 else background,
-                        color if font.FONT[idx+15] & _BIT3 else background,
-                        color if font.FONT[idx+15] & _BIT2 else background,
-                        color if font.FONT[idx+15] & _BIT1 else background,
-                        color if font.FONT[idx+15] & _BIT0 else background
-                    )
-                    self.blit_buffer(buffer, x0, y0+8*line, 16, 8)
-            x0 += font.WIDTH
+        width = font.WIDTH
+        height = font.HEIGHT
+        row_bytes = width // 8
+        buffer = self._strip
+        stride = len(glyphs) * width * 2
+        data = font.FONT
+
+        col = 0
+        for idx in glyphs:
+            i = col
+            for _ in range(height):
+                _expand_bytes(buffer, i, data, idx, row_bytes, lut)
+                i += stride
+                idx += row_bytes
+            col += width * 2
+
+        self._set_window(x, y, x + len(glyphs) * width - 1, y + height - 1)
+        self._writepixels(memoryview(buffer)[0:stride * height])
 
     def text(self, font, text, x0, y0, color=WHITE, background=BLACK):
         '''
-        Draw text on display in specified font and colors. 8 and 16 bit wide
-        fonts are supported.
+        Draw text on display in specified font and colors. 8x8, 8x16, 16x16
+        and 16x32 fonts are supported. The glyphs of the line are sent as a
+        single window, split into a few large chunks only when the line does
+        not fit the strip buffer. Characters outside the font are skipped.
         Args:
             font (module): font module to use.
             text (str): text to write
@@ -765,14 +734,44 @@ class ST7796:
             color (int): 565 encoded color to use for characters
             background (int): 565 encoded color to use for background
         '''
-        if font.WIDTH == 8:
-            self._text8(font, text, x0, y0, color, background)
-        else:
-            self._text16(font, text, x0, y0, color, background)
+        width = font.WIDTH
+        height = font.HEIGHT
+        if y0 + height > self.height:
+            return
+
+        glyph_bytes = width * height * 2
+        buffer = self._strip_buffer(glyph_bytes)
+        max_glyphs = len(buffer) // glyph_bytes
+        glyph_size = width // 8 * height
+        lut = self._lut(color, background)
+        glyphs = []
+        run_x = x0
+
+        for char in text:
+            ch = ord(char)
+            if not font.FIRST <= ch < font.LAST:
+                continue
+
+            if x0 + width > self.width:
+                break
+
+            if len(glyphs) == max_glyphs:
+                self._text_run(font, glyphs, run_x, y0, lut)
+                glyphs = []
+                run_x = x0
+
+            glyphs.append((ch - font.FIRST) * glyph_size)
+            x0 += width
+
+        if glyphs:
+            self._text_run(font, glyphs, run_x, y0, lut)
 
     def bitmap(self, bitmap, x, y, index=0):
         '''
-        Draw a bitmap on display at the specified column and row
+        Draw a bitmap on display at the specified column and row. Pixels
+        are palette indexes of 1 to 8 bits; 1, 2, 4 and 8 bit indexes are
+        expanded a byte at a time, other depths bit by bit. The expanded
+        frame is kept in the sprite cache when it is enabled.
         Args:
             bitmap (bitmap_module): The module containing the bitmap to draw
             x (int): column to start drawing at
@@ -780,84 +779,292 @@ class ST7796:
             index (int): Optional index of bitmap to draw from multiple bitmap
                 module
         '''
-        bitmap_size = bitmap.HEIGHT * bitmap.WIDTH
-        buffer_len = bitmap_size * 2
-        buffer = bytearray(buffer_len)
-        bs_bit = bitmap.BPP * bitmap_size * index if index > 0 else 0
-
-        for i in range(0, buffer_len, 2):
-            color_index = 0
-            for bit in range(bitmap.BPP):
-                color_index <<= 1
-                color_index |= (bitmap.BITMAP[bs_bit // 8]
-                                & 1 << (7 - (bs_bit % 8))) > 0
-                bs_bit += 1
-
-            color = bitmap.PALETTE[color_index]
-            buffer[i] = color & 0xff00 >> 8
-            buffer[i + 1] = color_index & 0xff
-
         to_col = x + bitmap.WIDTH - 1
         to_row = y + bitmap.HEIGHT - 1
-        if self.width > to_col and self.height > to_row:
-            self._set_window(x, y, to_col, to_row)
-            self._writedata(buffer)
+        if self.width <= to_col or self.height <= to_row:
+            return
 
-    # @micropython.native
-    def write(self, font, string, x, y, fg=WHITE, bg=BLACK):
-        '''
-        Write a string using a converted true-type font on the display starting
-        at the specified column and row
+        cache = self.sprite_cache
+        key = (bitmap, index)
+        buffer = cache.get(key) if cache is not None else None
+        if buffer is None:
+            bpp = bitmap.BPP
+            bitmap_size = bitmap.HEIGHT * bitmap.WIDTH
+            buffer = bytearray(bitmap_size * 2)
+            if 8 % bpp:
+                _expand_indices_bitwise(buffer, 0, bitmap.BITMAP,
+                                        bpp * bitmap_size * index, bitmap_size,
+                                        bitmap.PALETTE, bpp)
+            else:
+                _expand_indices(buffer, 0, bitmap.BITMAP,
+                                bpp * bitmap_size * index, bitmap_size,
+                                self._palette_lut(bitmap.PALETTE, bpp), bpp)
+            if cache is not None:
+                cache.put(key, buffer)
+
+        self._set_window(x, y, to_col, to_row)
+        self._writepixels(buffer)
+
+    def _lut(self, fg, bg):
+        '''
+        Return the 1bpp expansion table for a foreground and background
+        color pair. The LUT_CACHE most recently used tables are kept and the
+        least recently used one is rebuilt in place for a new pair.
+        Args:
+            fg (int): 565 encoded color for set bits
+            bg (int): 565 encoded color for clear bits
+        '''
+        return self._palette_lut((bg, fg), 1)
+
+    def _palette_lut(self, palette, bpp):
+        '''
+        Return the table that expands one byte of 1, 2, 4 or 8 bpp palette
+        indexes into RGB565 pixels. Tables are cached together with the text
+        color pairs of _lut.
+        Args:
+            palette (list): 565 encoded colors, indexed by the pixel values
+            bpp (int): bits per pixel of the indexes
+        '''
+        if 8 % bpp:
+            raise ValueError("palette tables need 1, 2, 4 or 8 bpp")
+        luts = self._luts
+        key = (bpp, tuple(palette))
+        for n, entry in enumerate(luts):
+            if entry[0] == key:
+                if n:
+                    luts.insert(0, luts.pop(n))
+                return entry[1]
+
+        if len(luts) < LUT_CACHE:
+            entry = [key, memoryview(bytearray(4096))]
+        else:
+            entry = luts.pop()
+            entry[0] = key
+        if bpp == 1:
+            _build_lut(entry[1], palette[1], palette[0])
+        else:
+            _build_palette_lut(entry[1], palette, bpp)
+        luts.insert(0, entry)
+        return entry[1]
+
+    def _strip_buffer(self, size):
+        '''
+        Return the shared text strip buffer, growing it if it can not hold
+        at least size bytes.
+        Args:
+            size (int): minimum number of bytes required
+        '''
+        if self._strip is None or len(self._strip) < size:
+            self._strip = bytearray(max(size, STRIP_BUFFER))
+        return self._strip
+
+    def _glyph_offset(self, font, char_index):
+        '''
+        Return the bit offset of a glyph in font.BITMAPS.
+        Args:
+            font (font): The module containing the converted true-type font
+            char_index (int): index of the glyph in font.MAP
+        '''
+        offset = char_index * font.OFFSET_WIDTH
+        bs_bit = font.OFFSETS[offset]
+        if font.OFFSET_WIDTH > 1:
+            bs_bit = (bs_bit << 8) + font.OFFSETS[offset + 1]
+
+        if font.OFFSET_WIDTH > 2:
+            bs_bit = (bs_bit << 8) + font.OFFSETS[offset + 2]
+
+        return bs_bit
+
+    def _render_glyph(self, dest, i, stride, font, char_index, width, lut):
+        '''
+        Expand one glyph of a converted true-type font into dest.
+        Args:
+            dest (bytearray): buffer receiving RGB565 pixels
+            i (int): offset of the glyph's top left pixel in dest
+            stride (int): bytes per row of dest
+            font (font): The module containing the converted true-type font
+            char_index (int): index of the glyph in font.MAP
+            width (int): glyph width in pixels
+            lut (memoryview): expansion table from _lut
+        '''
+        bitmaps = font.BITMAPS
+        bs_bit = self._glyph_offset(font, char_index)
+        for _ in range(font.HEIGHT):
+            _expand_bits(dest, i, bitmaps, bs_bit, width, lut)
+            i += stride
+            bs_bit += width
+
+    def _glyph_spans(self, font, char_index, width):
+        '''
+        Return the foreground of one glyph of a converted true-type font as
+        bytes of (x, y, width, height) rectangles: the horizontal runs of set
+        pixels of each row, with identical runs on consecutive rows merged.
+        Args:
+            font (font): The module containing the converted true-type font
+            char_index (int): index of the glyph in font.MAP
+            width (int): glyph width in pixels
+        '''
+        bitmaps = font.BITMAPS
+        bs_bit = self._glyph_offset(font, char_index)
+        row_runs = bytearray(width + 1)
+        rects = []
+        above = {}
+        for row in range(font.HEIGHT):
+            runs = {}
+            count = _bit_runs(bitmaps, bs_bit, width, row_runs)
+            for i in range(0, count * 2, 2):
+                start = row_runs[i]
+                length = row_runs[i + 1]
+                key = start << 8 | length
+                rect = above.get(key)
+                if rect is None:
+                    rect = [start, row, length, 0]
+                    rects.append(rect)
+                rect[3] += 1
+                runs[key] = rect
+            above = runs
+            bs_bit += width
+        spans = bytearray(len(rects) * 4)
+        i = 0
+        for rect in rects:
+            spans[i:i + 4] = bytes(rect)
+            i += 4
+        return spans
+
+    def _write_transparent(self, font, string, x, y, fg):
+        '''
+        Write a string drawing only the foreground pixels of each glyph, as
+        fill_rect spans, leaving the background untouched. The spans of each
+        glyph are taken from and added to the glyph cache when it is enabled.
+        Args:
+            font (font): The module containing the converted true-type font
+            string (string): The string to write
+            x (int): column to start writing
+            y (int): row to start writing
+            fg (int): foreground color
+        '''
+        index = _font_index(font)
+        cache = self.glyph_cache
+        for character in string:
+            char_index = index.get(ord(character))
+            if char_index is None:
+                continue
+
+            char_width = font.WIDTHS[char_index]
+            if x + char_width > self.width:
+                break
+
+            spans = None
+            if cache is not None:
+                key = (font, char_index)
+                spans = cache.get(key)
+            if spans is None:
+                spans = self._glyph_spans(font, char_index, char_width)
+                if cache is not None:
+                    cache.put(key, spans)
+            for i in range(0, len(spans), 4):
+                self.fill_rect(x + spans[i], y + spans[i + 1],
+                               spans[i + 2], spans[i + 3], fg)
+            x += char_width
+
+    def _write_run(self, font, glyphs, x, y, run_width, fg, bg):
+        '''
+        Render a run of glyphs side by side into the strip buffer and send it
+        to the display as a single window. Glyphs are taken from and added to
+        the glyph cache when it is enabled.
+        Args:
+            font (font): The module containing the converted true-type font
+            glyphs (list): (glyph index, width) pairs for each glyph in the run
+            x (int): column of the first glyph
+            y (int): row of the run
+            run_width (int): total width of the run in pixels
+            fg (int): foreground color
+            bg (int): background color
+        '''
+        height = font.HEIGHT
+        buffer = self._strip
+        stride = run_width * 2
+        lut = self._lut(fg, bg)
+        cache = self.glyph_cache
+
+        col = 0
+        for char_index, char_width in glyphs:
+            glyph_stride = char_width * 2
+            if cache is None:
+                self._render_glyph(
+                    buffer, col, stride, font, char_index, char_width, lut)
+            else:
+                key = (font, char_index, fg, bg)
+                glyph = cache.get(key)
+                if glyph is None:
+                    glyph = memoryview(bytearray(glyph_stride * height))
+                    self._render_glyph(
+                        glyph, 0, glyph_stride, font, char_index, char_width,
+                        lut)
+                    cache.put(key, glyph)
+                i = col
+                for j in range(0, glyph_stride * height, glyph_stride):
+                    buffer[i:i + glyph_stride] = glyph[j:j + glyph_stride]
+                    i += stride
+            col += glyph_stride
+
+        self._set_window(x, y, x + run_width - 1, y + height - 1)
+        self._writepixels(memoryview(buffer)[0:stride * height])
+
+    # @micropython.native
+    def write(self, font, string, x, y, fg=WHITE, bg=BLACK):
+        '''
+        Write a string using a converted true-type font on the display starting
+        at the specified column and row. The glyphs of the line are rendered
+        into one strip buffer and sent with a single window, split into a few
+        large chunks only when the line does not fit the strip buffer.
+        With bg None the text is transparent: only the foreground pixels are
+        drawn, as spans, over whatever is already on the display.
         Args:
             font (font): The module containing the converted true-type font
             s (string): The string to write
             x (int): column to start writing
             y (int): row to start writing
             fg (int): foreground color, optional, defaults to WHITE
-            bg (int): background color, optional, defaults to BLACK
+            bg (int): background color or None for transparent text,
+                optional, defaults to BLACK
         '''
-        buffer_len = font.HEIGHT * font.MAX_WIDTH * 2
-        buffer = bytearray(buffer_len)
-        fg_hi = (fg & 0xff00) >> 8
-        fg_lo = fg & 0xff
+        if y + font.HEIGHT > self.height:
+            return
+
+        if bg is None:
+            self._write_transparent(font, string, x, y, fg)
+            return
 
-        bg_hi = (bg & 0xff00) >> 8
-        bg_lo = bg & 0xff
+        row_bytes = font.HEIGHT * 2
+        buffer = self._strip_buffer(row_bytes * font.MAX_WIDTH)
+        max_width = len(buffer) // row_bytes
+        index = _font_index(font)
+        glyphs = []
+        run_x = x
+        run_width = 0
 
         for character in string:
-            try:
-                char_index = font.MAP.index(character)
-                offset = char_index * font.OFFSET_WIDTH
-                bs_bit = font.OFFSETS[offset]
-                if font.OFFSET_WIDTH > 1:
-                    bs_bit = (bs_bit << 8) + font.OFFSETS[offset + 1]
-
-                if font.OFFSET_WIDTH > 2:
-                    bs_bit = (bs_bit << 8) + font.OFFSETS[offset + 2]
-
-                char_width = font.WIDTHS[char_index]
-                buffer_needed = char_width * font.HEIGHT * 2
-
-                for i in range(0, buffer_needed, 2):
-                    if font.BITMAPS[bs_bit // 8] & 1 << (7 - (bs_bit % 8)) > 0:
-                        buffer[i] = fg_hi
-                        buffer[i + 1] = fg_lo
-                    else:
-                        buffer[i] = bg_hi
-                        buffer[i + 1] = bg_lo
+            char_index = index.get(ord(character))
+            if char_index is None:
+                continue
 
-                    bs_bit += 1
+            char_width = font.WIDTHS[char_index]
+            if x + char_width > self.width:
+                break
 
-                to_col = x + char_width - 1
-                to_row = y + font.HEIGHT - 1
-                if self.width > to_col and self.height > to_row:
-                    self._set_window(x, y, to_col, to_row)
-                    self._writedata(buffer[0:buffer_needed])
+            if run_width + char_width > max_width:
+                self._write_run(font, glyphs, run_x, y, run_width, fg, bg)
+                glyphs = []
+                run_x = x
+                run_width = 0
 
-                x += char_width
+            glyphs.append((char_index, char_width))
+            run_width += char_width
+            x += char_width
 
-            except ValueError:
-                pass
+        if glyphs:
+            self._write_run(font, glyphs, run_x, y, run_width, fg, bg)
 
     def write_width(self, font, string):
         '''
@@ -867,67 +1074,208 @@ class ST7796:
             font (font): The module containing the converted true-type font
             string (string): The string to measure
         '''
+        index = _font_index(font)
         width = 0
         for character in string:
-            try:
-                char_index = font.MAP.index(character)
+            char_index = index.get(ord(character))
+            if char_index is not None:
                 width += font.WIDTHS[char_index]
 
-            except ValueError:
-                pass
-
         return width
-    
+
+    def _span(self, x0, y0, dy, left, right, color, sector):
+        '''
+        Draw the horizontal span left..right on row y0 + dy, both relative
+        to the center x0, y0, clipped to a sector when one is given.
+        '''
+        if sector is None:
+            self.fill_rect(x0 + left, y0 + dy, right - left + 1, 1, color)
+            return
+        for lo, hi in _sector_row(sector, dy):
+            lo = max(lo, left)
+            hi = min(hi, right)
+            if lo <= hi:
+                self.fill_rect(x0 + lo, y0 + dy, hi - lo + 1, 1, color)
+
+    def _ellipse(self, x0, y0, rx, ry, thickness, color, sector=None):
+        '''
+        Draw an ellipse outline of the given thickness, or a filled ellipse
+        when thickness is 0, as one span per contiguous run of each row.
+        Rows of a filled ellipse with the same width are merged into a single
+        rectangle.
+        '''
+        if rx < 0 or ry < 0:
+            return
+        outer = _ellipse_extents(rx, ry)
+        if thickness == 0 and sector is None:
+            dy = 0
+            while dy <= ry:
+                xo = outer[dy]
+                end = dy
+                while end < ry and outer[end + 1] == xo:
+                    end += 1
+                if dy == 0:
+                    self.fill_rect(x0 - xo, y0 - end, 2 * xo + 1, 2 * end + 1, color)
+                else:
+                    self.fill_rect(x0 - xo, y0 + dy, 2 * xo + 1, end - dy + 1, color)
+                    self.fill_rect(x0 - xo, y0 - end, 2 * xo + 1, end - dy + 1, color)
+                dy = end + 1
+            return
+
+        if thickness == 0:
+            inner = [0] * (ry + 1)
+        else:
+            inner = _ring_extents(outer, rx, ry, thickness)
+        for dy in range(ry + 1):
+            xo = outer[dy]
+            xi = inner[dy]
+            for row in (dy, -dy) if dy else (0,):
+                if xi == 0:
+                    self._span(x0, y0, row, -xo, xo, color, sector)
+                else:
+                    self._span(x0, y0, row, -xo, -xi, color, sector)
+                    self._span(x0, y0, row, xi, xo, color, sector)
+
     def circle(self, x0, y0, radius, color):
-        # Circle drawing function.  Will draw a single pixel wide circle with
-        # center at x0, y0 and the specified radius.
-        f = 1 - radius
-        ddF_x = 1
-        ddF_y = -2 * radius
-        x = 0
-        y = radius
-        self._pixel(x0, y0 + radius, color)
-        self._pixel(x0, y0 - radius, color)
-        self._pixel(x0 + radius, y0, color)
-        self._pixel(x0 - radius, y0, color)
-        while x < y:
-            if f >= 0:
-                y -= 1
-                ddF_y += 2
-                f += ddF_y
-            x += 1
-            ddF_x += 2
-            f += ddF_x
-            self._pixel(x0 + x, y0 + y, color)
-            self._pixel(x0 - x, y0 + y, color)
-            self._pixel(x0 + x, y0 - y, color)
-            self._pixel(x0 - x, y0 - y, color)
-            self._pixel(x0 + y, y0 + x, color)
-            self._pixel(x0 - y, y0 + x, color)
-            self._pixel(x0 + y, y0 - x, color)
-            self._pixel(x0 - y, y0 - x, color)
+        '''
+        Draw a single pixel wide circle.
+        Args:
+            x0 (int): center x coordinate
+            y0 (int): center y coordinate
+            radius (int): radius in pixels
+            color (int): 565 encoded color
+        '''
+        self._ellipse(x0, y0, radius, radius, 1, color)
 
     def fill_circle(self, x0, y0, radius, color):
-        # Filled circle drawing function.  Will draw a filled circule with
-        # center at x0, y0 and the specified radius.
-        self.vline(x0, y0 - radius, 2*radius + 1, color)
-        f = 1 - radius
-        ddF_x = 1
-        ddF_y = -2 * radius
-        x = 0
-        y = radius
-        while x < y:
-            if f >= 0:
-                y -= 1
-                ddF_y += 2
-                f += ddF_y
-            x += 1
-            ddF_x += 2
-            f += ddF_x
-            self.vline(x0 + x, y0 - y, 2*y + 1, color)
-            self.vline(x0 + y, y0 - x, 2*x + 1, color)
-            self.vline(x0 - x, y0 - y, 2*y + 1, color)
-            self.vline(x0 - y, y0 - x, 2*x + 1, color)
+        '''
+        Draw a filled circle.
+        Args:
+            x0 (int): center x coordinate
+            y0 (int): center y coordinate
+            radius (int): radius in pixels
+            color (int): 565 encoded color
+        '''
+        self._ellipse(x0, y0, radius, radius, 0, color)
+
+    def ellipse(self, x0, y0, rx, ry, color, thickness=1):
+        '''
+        Draw an ellipse outline.
+        Args:
+            x0 (int): center x coordinate
+            y0 (int): center y coordinate
+            rx (int): horizontal radius in pixels
+            ry (int): vertical radius in pixels
+            color (int): 565 encoded color
+            thickness (int): outline thickness, optional, defaults to 1
+        '''
+        self._ellipse(x0, y0, rx, ry, thickness, color)
+
+    def fill_ellipse(self, x0, y0, rx, ry, color):
+        '''
+        Draw a filled ellipse.
+        Args:
+            x0 (int): center x coordinate
+            y0 (int): center y coordinate
+            rx (int): horizontal radius in pixels
+            ry (int): vertical radius in pixels
+            color (int): 565 encoded color
+        '''
+        self._ellipse(x0, y0, rx, ry, 0, color)
+
+    def arc(self, x0, y0, radius, start, end, color, thickness=1):
+        '''
+        Draw a circular arc swept clockwise from start to end. Angles are in
+        degrees with 0 at 3 o'clock.
+        Args:
+            x0 (int): center x coordinate
+            y0 (int): center y coordinate
+            radius (int): outer radius in pixels
+            start (int): start angle in degrees
+            end (int): end angle in degrees
+            color (int): 565 encoded color
+            thickness (int): arc thickness, optional, defaults to 1
+        '''
+        if end != start:
+            self._ellipse(x0, y0, radius, radius, thickness, color,
+                          _sector(start, end))
+
+    def pie(self, x0, y0, radius, start, end, color):
+        '''
+        Draw a filled pie segment swept clockwise from start to end. Angles
+        are in degrees with 0 at 3 o'clock.
+        Args:
+            x0 (int): center x coordinate
+            y0 (int): center y coordinate
+            radius (int): radius in pixels
+            start (int): start angle in degrees
+            end (int): end angle in degrees
+            color (int): 565 encoded color
+        '''
+        if end != start:
+            self._ellipse(x0, y0, radius, radius, 0, color,
+                          _sector(start, end))
+
+    def round_rect(self, x, y, w, h, r, color):
+        '''
+        Draw a single pixel wide rectangle with rounded corners.
+        Args:
+            x (int): Top left corner x coordinate
+            y (int): Top left corner y coordinate
+            w (int): Width in pixels
+            h (int): Height in pixels
+            r (int): corner radius in pixels
+            color (int): 565 encoded color
+        '''
+        r = max(0, min(r, (w - 1) // 2, (h - 1) // 2))
+        outer = _ellipse_extents(r, r)
+        inner = _ring_extents(outer, r, r, 1)
+        left = x + r
+        right = x + w - 1 - r
+        top = y + r
+        bottom = y + h - 1 - r
+        for dy in range(1, r + 1):
+            xo = outer[dy]
+            xi = inner[dy]
+            for row in (top - dy, bottom + dy):
+                if xi == 0:
+                    self.fill_rect(left - xo, row, right - left + 2 * xo + 1, 1, color)
+                else:
+                    self.fill_rect(left - xo, row, xo - xi + 1, 1, color)
+                    self.fill_rect(right + xi, row, xo - xi + 1, 1, color)
+        if r == 0:
+            self.rect(x, y, w, h, color)
+            return
+        self.fill_rect(x, top, 1, bottom - top + 1, color)
+        self.fill_rect(x + w - 1, top, 1, bottom - top + 1, color)
+
+    def fill_round_rect(self, x, y, w, h, r, color):
+        '''
+        Draw a filled rectangle with rounded corners. Corner rows of the
+        same width are merged into a single rectangle.
+        Args:
+            x (int): Top left corner x coordinate
+            y (int): Top left corner y coordinate
+            w (int): Width in pixels
+            h (int): Height in pixels
+            r (int): corner radius in pixels
+            color (int): 565 encoded color
+        '''
+        r = max(0, min(r, (w - 1) // 2, (h - 1) // 2))
+        outer = _ellipse_extents(r, r)
+        top = y + r
+        bottom = y + h - 1 - r
+        dy = 1
+        while dy <= r:
+            xo = outer[dy]
+            end = dy
+            while end < r and outer[end + 1] == xo:
+                end += 1
+            span = w - 2 * (r - xo)
+            self.fill_rect(x + r - xo, top - end, span, end - dy + 1, color)
+            self.fill_rect(x + r - xo, bottom + dy, span, end - dy + 1, color)
+            dy = end + 1
+        self.fill_rect(x, top, w, bottom - top + 1, color)
 
     def triangle(self, x0, y0, x1, y1, x2, y2, color):
         # Triangle drawing function.  Will draw a single pixel wide triangle
@@ -939,66 +1287,1574 @@ class ST7796:
     def fill_triangle(self, x0, y0, x1, y1, x2, y2, color):
         # Filled triangle drawing function.  Will draw a filled triangle around
         # the points (x0, y0), (x1, y1), and (x2, y2).
-        if y0 > y1:
-            y0, y1 = y1, y0
-            x0, x1 = x1, x0
-        if y1 > y2:
-            y2, y1 = y1, y2
-            x2, x1 = x1, x2
-        if y0 > y1:
-            y0, y1 = y1, y0
-            x0, x1 = x1, x0
-        a = 0
-        b = 0
-        y = 0
-        last = 0
-        if y0 == y2:
-            a = x0
-            b = x0
-            if x1 < a:
-                a = x1
-            elif x1 > b:
-                b = x1
-            if x2 < a:
-                a = x2
-            elif x2 > b:
-                b = x2
-            self.hline(a, y0, b-a+1, color)
-            return
-        dx01 = x1 - x0
-        dy01 = y1 - y0
-        dx02 = x2 - x0
-        dy02 = y2 - y0
-        dx12 = x2 - x1
-        dy12 = y2 - y1
-        if dy01 == 0:
-            dy01 = 1
-        if dy02 == 0:
-            dy02 = 1
-        if dy12 == 0:
-            dy12 = 1
-        sa = 0
-        sb = 0
-        if y1 == y2:
-            last = y1
+        self.fill_polygon(((x0, y0), (x1, y1), (x2, y2)), color)
+
+    def fill_polygon(self, points, color):
+        '''
+        Draw a filled polygon with an active edge table scanline fill using
+        the even-odd rule, so convex and concave polygons are supported.
+        Edge pixels are always included, so polygons sharing an edge leave no
+        seam. The spans of each row are merged before they are sent and the
+        polygon is clipped to the display.
+        Args:
+            points (list): (x, y) tuples of the vertices
+            color (int): 565 encoded color
+        '''
+        edges = []
+        for n in range(len(points)):
+            xa, ya = points[n - 1]
+            xb, yb = points[n]
+            if ya > yb:
+                xa, ya, xb, yb = xb, yb, xa, ya
+            edges.append((ya, yb, xa, xb))
+        edges.sort()
+        top = max(edges[0][0], 0)
+        bottom = min(max(edge[1] for edge in edges), self.height - 1)
+
+        active = []
+        k = 0
+        for y in range(top, bottom + 1):
+            while k < len(edges) and edges[k][0] <= y:
+                active.append(edges[k])
+                k += 1
+            spans = []
+            crossings = []
+            n = 0
+            while n < len(active):
+                ya, yb, xa, xb = active[n]
+                if yb < y:
+                    active.pop(n)
+                    continue
+                n += 1
+                dy = yb - ya
+                dx = xb - xa
+                if dy == 0:
+                    spans.append((min(xa, xb), max(xa, xb)))
+                    continue
+                # Pixels the edge passes through between y - 0.5 and y + 0.5
+                a = xa + _round_div(max(2 * (y - ya) - 1, 0) * dx, 2 * dy)
+                b = xa + _round_div(min(2 * (y - ya) + 1, 2 * dy) * dx, 2 * dy)
+                spans.append((min(a, b), max(a, b)))
+                if y < yb:
+                    crossings.append(xa + (y - ya) * dx / dy)
+
+            crossings.sort()
+            for n in range(0, len(crossings) - 1, 2):
+                spans.append((math.ceil(crossings[n]),
+                              math.floor(crossings[n + 1])))
+
+            spans.sort()
+            lo, hi = spans[0]
+            for a, b in spans:
+                if a > hi + 1:
+                    self.fill_rect(lo, y, hi - lo + 1, 1, color)
+                    lo = a
+                if b > hi:
+                    hi = b
+            self.fill_rect(lo, y, hi - lo + 1, 1, color)
+
+
+class ST7796(Graphics):
+    '''
+    ST7796 SPI display driver.
+    Args:
+        spi, cs, dc, rst: SPI bus and chip select, data/command and reset pins
+        w, h (int): display width and height before rotation
+        r (int): rotation, 0-7
+        buffer_size (int): pixels in the fill buffer; fills are streamed in
+            chunks of this size, larger values trade RAM for fewer SPI writes
+    '''
+    _profile = None
+    _busy = False
+
+    def __init__(self, spi, cs, dc, rst, w, h, r, buffer_size=MEMORY_BUFFER):
+        self.spi = spi
+        self.cs = cs
+        self.dc = dc
+        self.rst = rst
+        self.init_width = w
+        self.init_height = h
+        self.width = w
+        self.height = h
+        self.rotation = r
+        self.xstart = 0
+        self.ystart = 0
+        self.cs.init(self.cs.OUT, value=1)
+        self.dc.init(self.dc.OUT, value=0)
+        self.rst.init(self.rst.OUT, value=0)
+        self.buffer = bytearray(buffer_size * 2)
+        self._buffer_view = memoryview(self.buffer)
+        self._fill_color = None
+        self._format = COLOR_MODE_16BIT
+        self._fill_bytes = len(self.buffer)
+        self._fill_pixels = buffer_size
+        self._convert = None
+        self._pending = None
+        self._window_pixels = 0
+        self._written = 0
+        self._strip = None
+        self._luts = []
+        self.glyph_cache = None
+        self.sprite_cache = None
+        self.skipped_commands = 0
+        self._worker = None
+        self._worker_id = None
+        self._error = None
+        self._command = bytearray(1)
+        self._address = bytearray(4)
+        self.hard_reset()
+        self.soft_reset()
+        self.sleep_mode(False)
+        self.color_mode(COLOR_MODE_65K | COLOR_MODE_16BIT)
+        sleep_ms(50)
+        self._rotation(self.rotation)
+        self.init()
+        sleep_ms(500)
+        self.fill(0)
+
+    def init(self):
+      sleep_ms(120)
+      self._write(ST7796_CSCON,b'\xC3') #Enable extension command 2 partI
+      self._write(ST7796_CSCON,b'\x96') #Enable extension command 2 partII
+      
+ 
+      self._write(ST7796_INVCTL,b'\x01') #Display Inversion Control
+      self._write(ST7796_EMSET,b'\xC6') #Entry Mode Set
+      self._write(ST7796_PWCTL1,b'\x80\x45') #Power control1 
+      self._write(ST7796_PWCTL2,b'\x13') #Power control2  VAP(GVDD)=3.85+( vcom+vcom offset), VAN(GVCL)=-3.85+( vcom+vcom offset)
+      self._write(ST7796_PWCTL3,b'\xA7') #Power control 3  Source driving current level=low, Gamma driving current level=High
+      self._write(ST7796_VMCTL1,b'\x0A') #VCOM Control VCOM=0.9
+      self._write(ST7796_DTCTLA,b'\x40\x8A\x00\x00\x29\x19\xA5\x33') #Display Output Ctrl Adjust
+      #ST7796 Gamma Sequence
+      self._write(ST7796_GMCTLP1,b'\xD0\x08\x0F\x06\x06\x33\x30/x33\x47\x17\x13\x13\x2B\x31')
+      self._write(ST7796_GMCTLN1,b'\xD0\x0A\x11\x0B\x09\x07\x2F\x33\x47\x38\x15\x16\x2C\x32')
+
+      sleep_ms(120)
+      self._write(ST7796_CSCON,b'\xC3')  #Disable extension command 2 partI
+      self._write(ST7796_CSCON,b'\x69')  #Disable extension command 2 partII
+      sleep_ms(120)
+      self._write(ST7796_INVON) #Display Inversion On
+      sleep_ms(120)
+      self._write(ST7796_DISPON) #Display on
+
+    # This is the command sequence that rotates the ST7796 driver coordinate frame
+    def _rotation(self, m):
+      rotation = m % 8 # Limit the range of values to 0-7
+      if rotation == 0:  # 0 deg
+          madctl = ST7796_MADCTL_MX | ST7796_MADCTL_COLOR_ORDER
+          self.width  = self.init_width
+          self.height = self.init_height
+      elif rotation == 1: # 90 deg
+          madctl = ST7796_MADCTL_MV | ST7796_MADCTL_COLOR_ORDER
+          self.width  = self.init_height
+          self.height = self.init_width
+      elif rotation == 2: # 180 deg
+          madctl = ST7796_MADCTL_MY | ST7796_MADCTL_COLOR_ORDER
+          self.width  = self.init_width
+          self.height = self.init_height
+      elif rotation == 3: # 270 deg
+          madctl = ST7796_MADCTL_MX | ST7796_MADCTL_MY | ST7796_MADCTL_MV | ST7796_MADCTL_COLOR_ORDER
+          self.width  = self.init_height
+          self.height = self.init_width
+      # These next rotations are for bottom up BMP drawing
+      elif rotation == 4: # Mirrored + 0 deg
+          madctl = ST7796_MADCTL_MX | ST7796_MADCTL_MY | ST7796_MADCTL_COLOR_ORDER
+          self.width  = self.init_width
+          self.height = self.init_height
+      elif rotation == 5: # Mirrored + 90 deg
+          madctl = ST7796_MADCTL_MV | ST7796_MADCTL_MX | ST7796_MADCTL_COLOR_ORDER
+          self.width  = self.init_height
+          self.height = self.init_width
+      elif rotation == 6: # Mirrored + 180 deg
+          madctl = ST7796_MADCTL_COLOR_ORDER
+          self.width  = self.init_width
+          self.height = self.init_height
+      elif rotation == 7: # Mirrored + 270 deg
+          madctl = ST7796_MADCTL_MY | ST7796_MADCTL_MV | ST7796_MADCTL_COLOR_ORDER
+          self.width  = self.init_height
+          self.height = self.init_width
+      else:
+          madctl = ST7796_MADCTL_COLOR_ORDER
+      self._set_madctl(madctl)
+
+    def hard_reset(self):
+        ''' Hard reset display. '''
+        self.cs.off()
+        self.rst.on()
+        sleep_ms(50)
+        self.rst.off()
+        sleep_ms(50)
+        self.rst.on()
+        sleep_ms(150)
+        self.cs.on()
+        self._forget_state()
+
+    def soft_reset(self):
+        ''' Soft reset display. '''
+        self._write(ST7796_SWRESET)
+        sleep_ms(150)
+        self._forget_state()
+
+    def _forget_state(self):
+        '''
+        Forget the cached window, MADCTL and pixel format after a reset so
+        the next commands are always sent.
+        '''
+        self._columns = None
+        self._rows = None
+        self._madctl = None
+        self._pixfmt = None
+        self._partial_rows = None
+        self._partial = None
+        self._skip = False
+
+    def sleep_mode(self, value):
+        '''
+        Enable or disable display sleep mode.
+        Args:
+            value (bool): if True enable sleep mode. if False disable sleep
+            mode
+        '''
+        if value:
+            self._write(ST7796_SLPIN)
+        else:
+            self._write(ST7796_SLPOUT)
+
+    def inversion_mode(self, value):
+        '''
+        Enable or disable display inversion mode.
+        Args:
+            value (bool): if True enable inversion mode. if False disable
+            inversion mode
+        '''
+        if value:
+            self._write(ST7796_INVON)
+        else:
+            self._write(ST7796_INVOFF)
+
+    def idle_mode(self, value):
+        '''
+        Enable or disable display idle mode (8 colors, lower power).
+        Args:
+            value (bool): if True enable idle mode. if False disable idle
+            mode
+        '''
+        if value:
+            self._write(ST7796_IDMON)
         else:
-            last = y1-1
-        for y in range(y0, last+1):
-            a = x0 + sa // dy01
-            b = x0 + sb // dy02
-            sa += dx01
-            sb += dx02
-            if a > b:
-                a, b = b, a
-            self.hline(a, y, b-a+1, color)
-        sa = dx12 * (y - y1)
-        sb = dx02 * (y - y0)
-        while y <= y2:
-            a = x1 + sa // dy12
-            b = x0 + sb // dy02
-            sa += dx12
-            sb += dx02
-            if a > b:
-                a, b = b, a
-            self.hline(a, y, b-a+1, color)
-            y += 1    
\ No newline at end of file
+            self._write(ST7796_IDMOFF)
+
+    def partial_mode(self, start, end):
+        '''
+        Enter partial display mode, refreshing only rows start to end of the
+        panel's native rows. Those rows are a band of screen rows in
+        rotations 0, 2, 4 and 6 and a band of screen columns in rotations 1,
+        3, 5 and 7, mirrored when the rotation flips the row order. While
+        partial mode is active, fill_rect is clipped to the band and the
+        windows of other drawing methods that lie entirely outside it are
+        skipped; windows crossing its edge are sent whole.
+        Args:
+            start (int): first native row of the partial area
+            end (int): last native row of the partial area
+        '''
+        self._write(ST7796_PTLAR, struct.pack(">HH", start, end))
+        self._write(ST7796_PTLON)
+        self._partial_rows = (start, end)
+        self._set_partial()
+
+    def normal_mode(self):
+        '''
+        Leave partial display mode and refresh the whole display again.
+        '''
+        self._write(ST7796_NORON)
+        self._partial_rows = None
+        self._partial = None
+
+    def _set_partial(self):
+        '''
+        Convert the native rows of the partial area to the screen rectangle
+        they cover with the current MADCTL.
+        '''
+        if self._partial_rows is None:
+            self._partial = None
+            return
+        start, end = self._partial_rows
+        madctl = self._madctl or 0
+        if madctl & ST7796_MADCTL_MY:
+            start, end = self.init_height - 1 - end, self.init_height - 1 - start
+        if madctl & ST7796_MADCTL_MV:
+            self._partial = (start, 0, end, self.height - 1)
+        else:
+            self._partial = (0, start, self.width - 1, end)
+
+    def _set_color_mode(self, mode):
+        '''
+        Set display color mode.
+        Args:
+            mode (int): color mode
+                COLOR_MODE_65K, COLOR_MODE_262K, COLOR_MODE_12BIT,
+                COLOR_MODE_16BIT, COLOR_MODE_18BIT, COLOR_MODE_16M
+        '''
+        mode &= 0x77
+        if mode == self._pixfmt:
+            self.skipped_commands += 1
+            return
+        self._pixfmt = mode
+        self._write(ST7796_PIXFMT, bytes([mode]))
+
+    def color_mode(self, mode):
+        '''
+        Select the pixel format sent to the display. Colors stay 565 encoded
+        in every drawing method: fills are encoded directly in the selected
+        format and RGB565 data from text, bitmaps and buffers is converted
+        while it is sent. 12 bit mode packs two pixels in three bytes, 18 bit
+        mode sends three bytes per pixel. WriteBlock data is sent as is, so
+        it must already be in the selected format, e.g. 18 bit images.
+        Args:
+            mode (int): COLOR_MODE_12BIT, COLOR_MODE_16BIT or COLOR_MODE_18BIT,
+                optionally or'ed with COLOR_MODE_65K or COLOR_MODE_262K
+        '''
+        fmt = mode & 0x07
+        if fmt == COLOR_MODE_16BIT:
+            unit, unit_pixels = 2, 1
+        elif fmt == COLOR_MODE_18BIT:
+            unit, unit_pixels = 3, 1
+        elif fmt == COLOR_MODE_12BIT:
+            unit, unit_pixels = 3, 2
+        else:
+            raise ValueError("unsupported color mode")
+        if fmt != COLOR_MODE_16BIT and self._convert is None:
+            self._convert = bytearray(CONVERT_BUFFER * 3)
+        self._set_color_mode(mode)
+        self._format = fmt
+        units = len(self.buffer) // unit
+        self._fill_bytes = units * unit
+        self._fill_pixels = units * unit_pixels
+        self._fill_color = None
+        self._pending = None
+
+    def _pixel_bytes(self, count):
+        '''
+        Return the bytes taken by count pixels in the current color mode,
+        including the padding nibble of an odd 12 bit pixel.
+        Args:
+            count (int): number of pixels
+        '''
+        fmt = self._format
+        if fmt == COLOR_MODE_16BIT:
+            return count * 2
+        if fmt == COLOR_MODE_18BIT:
+            return count * 3
+        return (count * 3 + 1) // 2
+
+    def _set_madctl(self, madctl):
+        '''
+        Send MADCTL (memory data access control) unless it is unchanged.
+        Args:
+            madctl (int): MADCTL register value
+        '''
+        if madctl == self._madctl:
+            self.skipped_commands += 1
+            return
+        self._madctl = madctl
+        self._write(ST7796_MADCTL, bytes([madctl]))
+        self._set_partial()
+
+    def SetPosition(self,x,y):
+        self.xstart,self.ystart = x,y
+
+    def vscrdef(self, tfa, vsa, bfa):
+        '''
+        Set Vertical Scrolling Definition. The three areas are counted in the
+        panel's native rows and must add up to them, which are the screen
+        rows in rotations 0 and 6.
+        Args:
+            tfa (int): Top Fixed Area
+            vsa (int): Vertical Scrolling Area
+            bfa (int): Bottom Fixed Area
+        '''
+        self._write(ST7796_VSCRDEF, struct.pack(">HHH", tfa, vsa, bfa))
+
+    def vscsad(self, vssa):
+        '''
+        Set Vertical Scroll Start Address of RAM, the memory row shown at the
+        top of the scrolling area.
+        Args:
+            vssa (int): Vertical Scrolling Start Address
+        '''
+        self._write(ST7796_VSCRSADD, struct.pack(">H", vssa))
+
+    def set_glyph_cache(self, budget):
+        '''
+        Enable or disable the cache of rendered glyphs used by write.
+        Args:
+            budget (int): bytes of rendered RGB565 glyphs to keep, 0 disables
+                the cache
+        '''
+        self.glyph_cache = GlyphCache(budget) if budget > 0 else None
+
+    def set_sprite_cache(self, budget):
+        '''
+        Enable or disable the cache of expanded bitmap frames used by
+        bitmap.
+        Args:
+            budget (int): bytes of expanded RGB565 frames to keep, 0 disables
+                the cache
+        '''
+        self.sprite_cache = GlyphCache(budget) if budget > 0 else None
+
+    def set_profiling(self, enable):
+        '''
+        Enable or disable per method counters. While enabled, each call of a
+        public drawing method records its calls, pixels in the windows it
+        sets, bytes sent through _writedata, commands sent through _write
+        and microseconds taken. Nested drawing calls, such as the fill_rect
+        spans of line, are counted in the outermost call. The counters are
+        installed as instance attributes, so the disabled driver runs the
+        plain class methods.
+        Args:
+            enable (bool): if True start counting, if False stop counting and
+                keep the counters
+        '''
+        if self._profile is None:
+            self._profile = {}
+            self._profile_entry = None
+        for name in _PROFILED + ('_set_window', '_writedata', '_write'):
+            try:
+                delattr(self, name)
+            except AttributeError:
+                pass
+        if not enable:
+            return
+        cls = type(self)
+        for name in _PROFILED:
+            setattr(self, name, self._profiled(name, getattr(cls, name)))
+        set_window = cls._set_window
+        writedata = cls._writedata
+        write = cls._write
+
+        def _set_window(x0, y0, x1, y1):
+            entry = self._profile_entry
+            if entry is not None:
+                entry[1] += (x1 - x0 + 1) * (y1 - y0 + 1)
+            set_window(self, x0, y0, x1, y1)
+
+        def _writedata(data):
+            entry = self._profile_entry
+            if entry is not None:
+                entry[2] += len(data)
+            writedata(self, data)
+
+        def _write(command, data=None):
+            entry = self._profile_entry
+            if entry is not None:
+                entry[3] += 1
+            write(self, command, data)
+
+        self._set_window = _set_window
+        self._writedata = _writedata
+        self._write = _write
+
+    def _profiled(self, name, method):
+        '''
+        Return a wrapper of a drawing method that accumulates its counters
+        as [calls, pixels, bytes, commands, microseconds].
+        '''
+        profile = self._profile
+
+        def wrapper(*args, **kwargs):
+            if self._busy:
+                self._wait_idle()
+            if self._profile_entry is not None:
+                return method(self, *args, **kwargs)
+            entry = profile.get(name)
+            if entry is None:
+                entry = profile[name] = [0, 0, 0, 0, 0]
+            self._profile_entry = entry
+            start = ticks_us()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                entry[4] += ticks_diff(ticks_us(), start)
+                entry[0] += 1
+                self._profile_entry = None
+
+        return wrapper
+
+    def profile_snapshot(self, reset=False):
+        '''
+        Return the counters of every profiled method called so far as a dict
+        of dicts with 'calls', 'pixels', 'bytes', 'commands' and 'us' keys.
+        Args:
+            reset (bool): clear the counters after taking the snapshot,
+                optional, defaults to False
+        '''
+        snapshot = {}
+        for name, entry in (self._profile or {}).items():
+            snapshot[name] = {'calls': entry[0], 'pixels': entry[1],
+                              'bytes': entry[2], 'commands': entry[3],
+                              'us': entry[4]}
+        if reset:
+            self.profile_reset()
+        return snapshot
+
+    def profile_reset(self):
+        '''
+        Clear the profiling counters.
+        '''
+        if self._profile is not None:
+            for entry in self._profile.values():
+                entry[:] = [0, 0, 0, 0, 0]
+
+    def _write(self, command, data=None):
+        if self._busy:
+            self._wait_idle()
+        self._command[0] = command
+        self.dc.off()
+        self.cs.off()
+        self.spi.write(self._command)
+        if data is not None:
+            self.dc.on()
+            self.spi.write(data)
+        self.cs.on()
+
+    def _writedata(self, data):
+        if self._skip:
+            return
+        self.dc.on()
+        self.cs.off()
+        self.spi.write(data)
+        self.cs.on()
+
+    def _writepixels(self, data):
+        '''
+        Send big-endian RGB565 pixel data, converting it to the current color
+        mode. In 12 bit mode an odd pixel is held back until the next call
+        pairs it, or padded once the window is complete.
+        Args:
+            data (bytes): RGB565 pixels
+        '''
+        fmt = self._format
+        if fmt == COLOR_MODE_16BIT:
+            self._writedata(data)
+            return
+        if self._skip:
+            return
+        out = self._convert
+        view = memoryview(out)
+        data = memoryview(data)
+        end = len(data) & ~1
+        if fmt == COLOR_MODE_18BIT:
+            i = 0
+            while i < end:
+                n = min((end - i) >> 1, CONVERT_BUFFER)
+                _pack666(out, 0, data, i, n)
+                self._writedata(view[0:n * 3])
+                i += n * 2
+            return
+        pending = self._pending
+        i = 0
+        o = 0
+        if pending is not None and end:
+            color = data[0] << 8 | data[1]
+            out[0] = pending >> 4
+            out[1] = (pending & 0x0f) << 4 | color >> 12
+            out[2] = (color >> 3) & 0xf0 | (color >> 1) & 0x0f
+            pending = None
+            i = 2
+            o = 3
+        while end - i >= 4:
+            n = min((end - i) >> 2, (len(out) - o) // 3)
+            _pack444(out, o, data, i, n)
+            self._writedata(view[0:o + n * 3])
+            i += n * 4
+            o = 0
+        if i < end:
+            color = data[i] << 8 | data[i + 1]
+            pending = ((color >> 4) & 0xf00 | (color >> 3) & 0xf0
+                       | (color >> 1) & 0x0f)
+        self._written += end >> 1
+        if pending is not None and self._written >= self._window_pixels:
+            out[o] = pending >> 4
+            out[o + 1] = (pending & 0x0f) << 4
+            o += 2
+            pending = None
+        self._pending = pending
+        if o:
+            self._writedata(view[0:o])
+
+    def WriteBlock(self, x0, y0, x1, y1, data=None):
+        self._set_address(ST7796_CASET, x0, x1)
+        self._set_address(ST7796_RASET, y0, y1)
+        self._write(ST7796_RAMWR, data)
+
+    def fill_rect(self, x, y, width, height, color):
+        '''
+        Draw a rectangle at the given location, size and filled with color.
+        The rectangle is clipped to the display and to the partial area when
+        partial mode is active.
+        Args:
+            x (int): Top left corner x coordinate
+            y (int): Top left corner y coordinate
+            width (int): Width in pixels
+            height (int): Height in pixels
+            color (int): 565 encoded color
+        '''
+        if x < 0:
+            width += x
+            x = 0
+        if y < 0:
+            height += y
+            y = 0
+        if x + width > self.width:
+            width = self.width - x
+        if y + height > self.height:
+            height = self.height - y
+        partial = self._partial
+        if partial is not None:
+            if x < partial[0]:
+                width -= partial[0] - x
+                x = partial[0]
+            if x + width > partial[2] + 1:
+                width = partial[2] + 1 - x
+            if y < partial[1]:
+                height -= partial[1] - y
+                y = partial[1]
+            if y + height > partial[3] + 1:
+                height = partial[3] + 1 - y
+        if width <= 0 or height <= 0:
+            return
+        self._set_window(x, y, x + width - 1, y + height - 1)
+        view = self._fill_pattern(color)
+        chunks, rest = divmod(width * height, self._fill_pixels)
+        for _ in range(chunks):
+            self._writedata(view)
+        if rest:
+            self._writedata(view[0:self._pixel_bytes(rest)])
+
+    def _fill_pattern(self, color):
+        '''
+        Return self.buffer filled with color in the current color mode,
+        refilling it only when the color differs from the previous fill.
+        Args:
+            color (int): 565 encoded color
+        '''
+        view = self._buffer_view[0:self._fill_bytes]
+        if color != self._fill_color:
+            size = len(view)
+            fmt = self._format
+            if fmt == COLOR_MODE_16BIT:
+                view[0] = color >> 8
+                view[1] = color & 0xff
+                n = 2
+            elif fmt == COLOR_MODE_18BIT:
+                view[0] = (color >> 8) & 0xf8
+                view[1] = (color >> 3) & 0xfc
+                view[2] = (color << 3) & 0xf8
+                n = 3
+            else:
+                red = color >> 12
+                green = (color >> 7) & 0x0f
+                blue = (color >> 1) & 0x0f
+                view[0] = red << 4 | green
+                view[1] = blue << 4 | red
+                view[2] = green << 4 | blue
+                n = 3
+            _replicate(view, n, size)
+            self._fill_color = color
+        return view
+
+    def _set_columns(self, start, end):
+        '''
+        Send CASET (column address set) command to display.
+        Args:
+            start (int): column start address
+            end (int): column end address
+        '''
+        if start <= end <= self.width:
+            self._set_address(
+                ST7796_CASET, start + self.xstart, end + self.xstart)
+
+    def _set_rows(self, start, end):
+        '''
+        Send RASET (row address set) command to display.
+        Args:
+            start (int): row start address
+            end (int): row end address
+       '''
+        if start <= end <= self.height:
+            self._set_address(
+                ST7796_RASET, start + self.ystart, end + self.ystart)
+
+    def _set_address(self, command, start, end):
+        '''
+        Send CASET or RASET unless the display already has that range.
+        Args:
+            command (int): ST7796_CASET or ST7796_RASET
+            start (int): start address
+            end (int): end address
+        '''
+        key = start << 16 | end
+        if command == ST7796_CASET:
+            if key == self._columns:
+                self.skipped_commands += 1
+                return
+            self._columns = key
+        else:
+            if key == self._rows:
+                self.skipped_commands += 1
+                return
+            self._rows = key
+        address = self._address
+        address[0] = (start >> 8) & 0xff
+        address[1] = start & 0xff
+        address[2] = (end >> 8) & 0xff
+        address[3] = end & 0xff
+        self._write(command, address)
+
+    def _set_window(self, x0, y0, x1, y1):
+        '''
+        Set window to column and row address.
+        Args:
+            x0 (int): column start address
+            y0 (int): row start address
+            x1 (int): column end address
+            y1 (int): row end address
+        '''
+        if self._busy:
+            self._wait_idle()
+        partial = self._partial
+        self._skip = partial is not None and (
+            x1 < partial[0] or x0 > partial[2]
+            or y1 < partial[1] or y0 > partial[3])
+        self._pending = None
+        self._window_pixels = (x1 - x0 + 1) * (y1 - y0 + 1)
+        self._written = 0
+        if self._skip:
+            return
+        self._set_columns(x0, x1)
+        self._set_rows(y0, y1)
+        self._write(ST7796_RAMWR)
+
+    def _start_transfer(self, buffer, x, y, width, height):
+        '''
+        Start sending buffer to a window. When a worker thread can run the
+        SPI transfer, return without waiting for it; otherwise send it now.
+        Until the transfer has finished, drawing on the display from another
+        thread or task blocks in _set_window or _write, since the transfer
+        uses the window, command and conversion state of the driver.
+        Args:
+            buffer (bytes): Data to copy to display
+            x (int): Top left corner x coordinate
+            Y (int): Top left corner y coordinate
+            width (int): Width
+            height (int): Height
+        '''
+        if self._worker is None:
+            self._worker = False
+            if _thread is not None:
+                try:
+                    self._job_ready = _thread.allocate_lock()
+                    self._job_ready.acquire()
+                    _thread.start_new_thread(self._transfer_worker, ())
+                    self._worker = True
+                except (OSError, RuntimeError):
+                    pass
+        if not self._worker:
+            self.blit_buffer(buffer, x, y, width, height)
+            return
+        self._job = (buffer, x, y, width, height)
+        self._busy = True
+        self._job_ready.release()
+
+    def _transfer_worker(self):
+        '''
+        Worker thread body: send each job handed over by _start_transfer,
+        until stop_worker hands over no job. An exception ends the thread;
+        it is kept for _wait_idle or _wait_transfer to raise, and the next
+        transfer starts a new worker.
+        '''
+        self._worker_id = _thread.get_ident()
+        while True:
+            self._job_ready.acquire()
+            job = self._job
+            if job is None:
+                break
+            try:
+                self.blit_buffer(*job)
+            except Exception as e:
+                self._error = e
+                self._worker = None
+                break
+            finally:
+                self._job = None
+                self._busy = False
+
+    def _raise_error(self):
+        '''Raise the exception that ended the worker thread, once.'''
+        error = self._error
+        if error is not None:
+            self._error = None
+            raise error
+
+    def _wait_idle(self):
+        '''
+        Block until the worker thread has finished its transfer. Calls made
+        by the worker itself return at once.
+        '''
+        if _thread.get_ident() == self._worker_id:
+            return
+        while self._busy:
+            sleep_ms(0)
+        self._raise_error()
+
+    def stop_worker(self):
+        '''
+        Wait for the current transfer and end the worker thread started by
+        BandRenderer.flush_async. A later flush_async starts a new worker.
+        '''
+        if self._worker:
+            self._wait_idle()
+            self._job = None
+            self._job_ready.release()
+        self._worker = None
+
+    async def _wait_transfer(self):
+        '''
+        Yield to other tasks until the transfer started by _start_transfer
+        has finished.
+        '''
+        await asyncio.sleep(0)
+        while self._busy:
+            await asyncio.sleep(0)
+        self._raise_error()
+
+
+class Console:
+    '''
+    Scrolling text console on the hardware vertical scrolling area. Each new
+    line is drawn once with write into the oldest line of memory and the
+    scroll start address is moved, so scrolling costs a few bytes on the bus
+    instead of a repaint. Needs a rotation where the panel's native rows are
+    the screen rows (0 or 6); other rotations raise ValueError.
+    Args:
+        display (ST7796): display to draw on
+        font (font): The module containing the converted true-type font
+        top (int): rows of the fixed area above the console
+        bottom (int): rows of the fixed area below the console
+        fg (int): foreground color, optional, defaults to WHITE
+        bg (int): background color, optional, defaults to BLACK
+    '''
+    def __init__(self, display, font, top=0, bottom=0, fg=WHITE, bg=BLACK):
+        if display.rotation % 8 not in (0, 6):
+            raise ValueError("Console needs rotation 0 or 6")
+        self.display = display
+        self.font = font
+        self.fg = fg
+        self.bg = bg
+        self.top = top
+        self.lines = (display.height - top - bottom) // font.HEIGHT
+        rows = self.lines * font.HEIGHT
+        display.vscrdef(top, rows, display.height - top - rows)
+        self.clear()
+
+    def clear(self):
+        '''
+        Clear the console and reset scrolling.
+        '''
+        self.display.fill_rect(0, self.top, self.display.width,
+                               self.lines * self.font.HEIGHT, self.bg)
+        self._count = 0
+        self._first = 0
+        self.display.vscsad(self.top)
+
+    def _line(self, text):
+        '''
+        Draw one line of text, scrolling up by a line when the console is
+        full.
+        '''
+        display = self.display
+        height = self.font.HEIGHT
+        scroll = self._count == self.lines
+        if scroll:
+            slot = self._first
+            self._first = (self._first + 1) % self.lines
+        else:
+            slot = self._count
+            self._count += 1
+        y = self.top + slot * height
+        display.write(self.font, text, 0, y, self.fg, self.bg)
+        width = display.write_width(self.font, text)
+        display.fill_rect(width, y, display.width - width, height, self.bg)
+        if scroll:
+            display.vscsad(self.top + self._first * height)
+
+    def print(self, text):
+        '''
+        Print text on new lines, wrapping it at the display width and at
+        newline characters.
+        Args:
+            text (str): text to print
+        '''
+        display = self.display
+        font = self.font
+        for line in text.split('\n'):
+            start = 0
+            width = 0
+            for n in range(len(line)):
+                char_width = display.write_width(font, line[n])
+                if width + char_width > display.width and n > start:
+                    self._line(line[start:n])
+                    start = n
+                    width = 0
+                width += char_width
+            self._line(line[start:])
+
+
+class TextField:
+    '''
+    Line of text bound to a position, font and colors that is redrawn
+    incrementally. The glyphs drawn last are remembered by x offset;
+    update() redraws only the glyphs that changed, or moved, as runs with
+    write and clears the width left over when the text got shorter. Widths
+    come from the font metrics, as in write_width, so proportional fonts
+    keep their positions. After changing fg or bg call clear() so the next
+    update repaints the whole text.
+    Args:
+        display (ST7796): display to draw on
+        font (font): The module containing the converted true-type font
+        x (int): column of the first glyph
+        y (int): row of the text
+        fg (int): foreground color, optional, defaults to WHITE
+        bg (int): background color, optional, defaults to BLACK
+    '''
+    def __init__(self, display, font, x, y, fg=WHITE, bg=BLACK):
+        self.display = display
+        self.font = font
+        self.x = x
+        self.y = y
+        self.fg = fg
+        self.bg = bg
+        self._drawn = {}
+        self._width = 0
+
+    def clear(self):
+        '''
+        Clear the text from the display and forget the drawn glyphs.
+        '''
+        if self._width:
+            self.display.fill_rect(self.x, self.y, self._width,
+                                   self.font.HEIGHT, self.bg)
+        self._drawn = {}
+        self._width = 0
+
+    def update(self, text):
+        '''
+        Show text, redrawing only what differs from the text shown before.
+        Args:
+            text (str): new text
+        '''
+        display = self.display
+        font = self.font
+        index = _font_index(font)
+        drawn = self._drawn
+        glyphs = {}
+        runs = []
+        run = None
+        x = self.x
+        for character in text:
+            char_index = index.get(ord(character))
+            if char_index is None:
+                continue
+
+            char_width = font.WIDTHS[char_index]
+            if x + char_width > display.width:
+                break
+
+            glyphs[x] = char_index
+            if drawn.get(x) == char_index:
+                run = None
+            elif run is None:
+                run = [x, character]
+                runs.append(run)
+            else:
+                run[1] += character
+            x += char_width
+
+        for run_x, string in runs:
+            display.write(font, string, run_x, self.y, self.fg, self.bg)
+        width = x - self.x
+        if width < self._width:
+            display.fill_rect(x, self.y, self._width - width, font.HEIGHT,
+                              self.bg)
+        self._drawn = glyphs
+        self._width = width
+
+
+class Canvas(Graphics):
+    '''
+    Off-screen RGB565 buffer for a region of the display. Every Graphics
+    drawing method draws into the buffer instead of the display, using
+    coordinates relative to the top left corner of the region, and the
+    changed areas are recorded. flush() sends only those areas.
+    Args:
+        display (ST7796): display the canvas is flushed to
+        x, y (int): top left corner of the region on the display
+        width, height (int): size of the region in pixels
+        rows (int): rows kept in memory, starting at row _top, optional,
+            defaults to height
+    The glyph and sprite caches are the display's.
+    '''
+    def __init__(self, display, x, y, width, height, rows=0):
+        self.display = display
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self._top = 0
+        self._buffer_rows = rows or height
+        self.buffer = bytearray(width * self._buffer_rows * 2)
+        self._view = memoryview(self.buffer)
+        self._luts = display._luts
+        self._window = (0, 0, width - 1, height - 1)
+        self._cursor = 0
+        self._dirty = []
+
+    @property
+    def glyph_cache(self):
+        return self.display.glyph_cache
+
+    @property
+    def sprite_cache(self):
+        return self.display.sprite_cache
+
+    def _mark(self, x0, y0, x1, y1):
+        '''
+        Record a changed area, merging it with the dirty rectangles it
+        touches. When more than DIRTY_RECTS remain, the pair whose bounding
+        box adds the least area is merged.
+        '''
+        x0 = max(x0, 0)
+        y0 = max(y0, self._top)
+        x1 = min(x1, self.width - 1)
+        y1 = min(y1, self._top + self._buffer_rows - 1)
+        if x0 > x1 or y0 > y1:
+            return
+        dirty = self._dirty
+        n = 0
+        while n < len(dirty):
+            a0, b0, a1, b1 = dirty[n]
+            if a0 <= x1 + 1 and x0 <= a1 + 1 and b0 <= y1 + 1 and y0 <= b1 + 1:
+                dirty.pop(n)
+                x0 = min(x0, a0)
+                y0 = min(y0, b0)
+                x1 = max(x1, a1)
+                y1 = max(y1, b1)
+                n = 0
+            else:
+                n += 1
+        dirty.append((x0, y0, x1, y1))
+
+        while len(dirty) > DIRTY_RECTS:
+            best = None
+            for i in range(len(dirty)):
+                a0, b0, a1, b1 = dirty[i]
+                for j in range(i + 1, len(dirty)):
+                    c0, d0, c1, d1 = dirty[j]
+                    u0 = min(a0, c0)
+                    v0 = min(b0, d0)
+                    u1 = max(a1, c1)
+                    v1 = max(b1, d1)
+                    cost = ((u1 - u0 + 1) * (v1 - v0 + 1)
+                            - (a1 - a0 + 1) * (b1 - b0 + 1)
+                            - (c1 - c0 + 1) * (d1 - d0 + 1))
+                    if best is None or cost < best[0]:
+                        best = (cost, i, j, (u0, v0, u1, v1))
+            dirty.pop(best[2])
+            dirty.pop(best[1])
+            dirty.append(best[3])
+
+    def _set_window(self, x0, y0, x1, y1):
+        '''
+        Start writing pixel data at the top left corner of a window of the
+        buffer and mark the window as changed.
+        '''
+        self._window = (x0, y0, x1, y1)
+        self._cursor = 0
+        self._mark(x0, y0, x1, y1)
+
+    def _writedata(self, data):
+        '''
+        Copy pixel data into the current window of the buffer, row by row,
+        dropping pixels outside the canvas.
+        '''
+        x0, y0, x1, y1 = self._window
+        window_width = x1 - x0 + 1
+        window_height = y1 - y0 + 1
+        width = self.width
+        buffer = self._view
+        data = memoryview(data)
+        i = 0
+        size = len(data)
+        p = self._cursor
+        while i < size:
+            row, col = divmod(p, window_width)
+            count = min(window_width - col, (size - i) // 2)
+            if count <= 0:
+                break
+            y = y0 + row % window_height - self._top
+            x = x0 + col
+            if 0 <= y < self._buffer_rows:
+                a = max(x, 0)
+                b = min(x + count, width)
+                if a < b:
+                    j = (y * width + a) * 2
+                    k = i + (a - x) * 2
+                    buffer[j:j + (b - a) * 2] = data[k:k + (b - a) * 2]
+            i += count * 2
+            p += count
+        self._cursor = p
+
+    def _writepixels(self, data):
+        '''
+        Canvas buffers always hold RGB565, whatever the display color mode.
+        '''
+        self._writedata(data)
+
+    @property
+    def _strip(self):
+        return self.display._strip
+
+    def _strip_buffer(self, size):
+        '''
+        Return the display's text strip buffer, so canvases and bands add no
+        strip of their own. The transfer worker only sends canvas buffers,
+        never the strip.
+        '''
+        return self.display._strip_buffer(size)
+
+    def _text_run(self, font, glyphs, x, y, lut):
+        '''
+        Expand the rows of a run of romfont glyphs that fall inside the
+        buffer straight into it. Runs crossing the left or right edge go
+        through the strip buffer.
+        '''
+        width = font.WIDTH
+        run_width = len(glyphs) * width
+        if x < 0 or x + run_width > self.width:
+            Graphics._text_run(self, font, glyphs, x, y, lut)
+            return
+        top = max(y, self._top)
+        bottom = min(y + font.HEIGHT, self._top + self._buffer_rows)
+        if top >= bottom:
+            return
+        row_bytes = width // 8
+        stride = self.width * 2
+        buffer = self._view
+        data = font.FONT
+        i = (top - self._top) * stride + x * 2
+        offset = (top - y) * row_bytes
+        for _ in range(top, bottom):
+            col = i
+            for idx in glyphs:
+                _expand_bytes(buffer, col, data, idx + offset, row_bytes, lut)
+                col += width * 2
+            i += stride
+            offset += row_bytes
+        self._mark(x, top, x + run_width - 1, bottom - 1)
+
+    def _write_run(self, font, glyphs, x, y, run_width, fg, bg):
+        '''
+        Expand the rows of a run of true-type glyphs that fall inside the
+        buffer straight into it, copying cached glyphs when the glyph cache
+        is enabled. Runs crossing the left or right edge go through the
+        strip buffer.
+        '''
+        if x < 0 or x + run_width > self.width:
+            Graphics._write_run(self, font, glyphs, x, y, run_width, fg, bg)
+            return
+        height = font.HEIGHT
+        top = max(y, self._top)
+        bottom = min(y + height, self._top + self._buffer_rows)
+        if top >= bottom:
+            return
+        stride = self.width * 2
+        buffer = self._view
+        lut = self._lut(fg, bg)
+        cache = self.glyph_cache
+        start = (top - self._top) * stride + x * 2
+        for char_index, char_width in glyphs:
+            glyph_stride = char_width * 2
+            glyph = None
+            if cache is not None:
+                key = (font, char_index, fg, bg)
+                glyph = cache.get(key)
+                if glyph is None:
+                    glyph = memoryview(bytearray(glyph_stride * height))
+                    self._render_glyph(
+                        glyph, 0, glyph_stride, font, char_index, char_width,
+                        lut)
+                    cache.put(key, glyph)
+            i = start
+            if glyph is None:
+                bit = (self._glyph_offset(font, char_index)
+                       + (top - y) * char_width)
+                for _ in range(top, bottom):
+                    _expand_bits(buffer, i, font.BITMAPS, bit, char_width, lut)
+                    i += stride
+                    bit += char_width
+            else:
+                for j in range((top - y) * glyph_stride,
+                               (bottom - y) * glyph_stride, glyph_stride):
+                    buffer[i:i + glyph_stride] = glyph[j:j + glyph_stride]
+                    i += stride
+            start += glyph_stride
+        self._mark(x, top, x + run_width - 1, bottom - 1)
+
+    def fill_rect(self, x, y, width, height, color):
+        '''
+        Draw a rectangle at the given location, size and filled with color.
+        Args:
+            x (int): Top left corner x coordinate
+            y (int): Top left corner y coordinate
+            width (int): Width in pixels
+            height (int): Height in pixels
+            color (int): 565 encoded color
+        '''
+        x0 = max(x, 0)
+        y0 = max(y, self._top)
+        x1 = min(x + width, self.width)
+        y1 = min(y + height, self._top + self._buffer_rows)
+        if x0 >= x1 or y0 >= y1:
+            return
+        buffer = self._view
+        stride = self.width * 2
+        start = ((y0 - self._top) * self.width + x0) * 2
+        end = start + (x1 - x0) * 2
+        buffer[start] = color >> 8
+        buffer[start + 1] = color & 0xff
+        n = start + 2
+        while n < end:
+            count = min(n - start, end - n)
+            buffer[n:n + count] = buffer[start:start + count]
+            n += count
+        row = buffer[start:end]
+        for i in range(start + stride, (y1 - self._top) * stride, stride):
+            buffer[i:i + end - start] = row
+        self._mark(x0, y0, x1 - 1, y1 - 1)
+
+    def flush(self):
+        '''
+        Send the dirty rectangles to the display, one window each, and
+        clear them.
+        '''
+        stride = self.width * 2
+        for x0, y0, x1, y1 in self._dirty:
+            width = x1 - x0 + 1
+            height = y1 - y0 + 1
+            start = (y0 - self._top) * stride + x0 * 2
+            if width == self.width:
+                self.display.blit_buffer(
+                    self._view[start:start + height * stride],
+                    self.x + x0, self.y + y0, width, height)
+            else:
+                self.display.blit_buffer(
+                    self._view[start:], self.x + x0, self.y + y0, width,
+                    height, stride)
+        self._dirty = []
+
+
+class IndexedCanvas(Canvas):
+    '''
+    Off-screen framebuffer of 4 or 8 bit palette indexes for a region of
+    the display. Drawing methods take palette indexes as colors. flush()
+    expands the dirty rows through the palette into a line buffer, so
+    changing the palette recolors the whole region without redrawing.
+    Args:
+        display (ST7796): display the canvas is flushed to
+        x, y (int): top left corner of the region on the display
+        width, height (int): size of the region in pixels
+        bpp (int): bits per pixel, 4 or 8, optional, defaults to 4
+        palette (list): 565 encoded colors, optional, defaults to PALETTE16
+    '''
+    glyph_cache = None
+    sprite_cache = None
+    # the buffer holds indexes, so text goes through _writedata
+    _text_run = Graphics._text_run
+    _write_run = Graphics._write_run
+
+    def __init__(self, display, x, y, width, height, bpp=4, palette=PALETTE16):
+        self.display = display
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self._top = 0
+        self._buffer_rows = height
+        self._stride = (width * bpp + 7) // 8
+        self.buffer = bytearray(self._stride * height)
+        self._view = memoryview(self.buffer)
+        self._line = bytearray(width * 2)
+        self._pal = bytearray(1024 if bpp == 4 else 512)
+        self._luts = display._luts
+        self._window = (0, 0, width - 1, height - 1)
+        self._cursor = 0
+        self._dirty = []
+        self.set_palette(palette)
+
+    def set_palette(self, palette):
+        '''
+        Replace the palette and mark the whole canvas for the next flush.
+        Args:
+            palette (list): 565 encoded colors, up to 16 for 4 bpp and 256
+                for 8 bpp
+        '''
+        self.palette = list(palette)
+        _build_palette_lut(self._pal, self.palette, self.bpp)
+        self._mark(0, 0, self.width - 1, self.height - 1)
+
+    def set_palette_color(self, index, color):
+        '''
+        Change one palette entry and mark the whole canvas for the next
+        flush.
+        Args:
+            index (int): palette index
+            color (int): 565 encoded color
+        '''
+        palette = self.palette
+        while len(palette) <= index:
+            palette.append(0)
+        palette[index] = color
+        self.set_palette(palette)
+
+    def _set_index(self, x, y, index):
+        '''
+        Store a palette index at x, y of the buffer.
+        '''
+        buffer = self.buffer
+        if self.bpp == 8:
+            buffer[y * self._stride + x] = index
+            return
+        j = y * self._stride + (x >> 1)
+        if x & 1:
+            buffer[j] = (buffer[j] & 0xf0) | (index & 0x0f)
+        else:
+            buffer[j] = (buffer[j] & 0x0f) | ((index & 0x0f) << 4)
+
+    def _writedata(self, data):
+        '''
+        Store pixel data in the current window of the buffer, row by row,
+        dropping pixels outside the canvas. Each 16 bit pixel holds a
+        palette index.
+        '''
+        x0, y0, x1, y1 = self._window
+        window_width = x1 - x0 + 1
+        window_height = y1 - y0 + 1
+        p = self._cursor
+        for i in range(1, len(data), 2):
+            row, col = divmod(p, window_width)
+            y = y0 + row % window_height
+            x = x0 + col
+            if 0 <= x < self.width and 0 <= y < self.height:
+                self._set_index(x, y, data[i])
+            p += 1
+        self._cursor = p
+
+    def fill_rect(self, x, y, width, height, color):
+        '''
+        Draw a rectangle at the given location, size and filled with a
+        palette index.
+        Args:
+            x (int): Top left corner x coordinate
+            y (int): Top left corner y coordinate
+            width (int): Width in pixels
+            height (int): Height in pixels
+            color (int): palette index
+        '''
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.width)
+        y1 = min(y + height, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        stride = self._stride
+        buffer = self._view
+        if self.bpp == 4:
+            color &= 0x0f
+            byte = color << 4 | color
+            a = (x0 + 1) >> 1
+            b = x1 >> 1
+        else:
+            byte = color & 0xff
+            a = x0
+            b = x1
+        start = y0 * stride + a
+        end = y0 * stride + b
+        if start < end:
+            buffer[start] = byte
+            n = start + 1
+            while n < end:
+                count = min(n - start, end - n)
+                buffer[n:n + count] = buffer[start:start + count]
+                n += count
+            row = buffer[start:end]
+            for i in range(start + stride, y1 * stride, stride):
+                buffer[i:i + end - start] = row
+        if self.bpp == 4:
+            for y in range(y0, y1):
+                if x0 & 1:
+                    self._set_index(x0, y, color)
+                if x1 & 1 and x1 - 1 >= x0 + (x0 & 1):
+                    self._set_index(x1 - 1, y, color)
+        self._mark(x0, y0, x1 - 1, y1 - 1)
+
+    def _expand_row(self, y, x0, x1):
+        '''
+        Expand pixels x0..x1 of row y through the palette into the line
+        buffer and return the number of bytes written.
+        '''
+        bpp = self.bpp
+        count = x1 - x0 + 1
+        _expand_indices(self._line, 0, self.buffer,
+                        y * self._stride * 8 + x0 * bpp, count, self._pal, bpp)
+        return count * 2
+
+    def flush(self):
+        '''
+        Expand the dirty rectangles through the palette and send them to the
+        display, one window each, and clear them.
+        '''
+        display = self.display
+        line = memoryview(self._line)
+        for x0, y0, x1, y1 in self._dirty:
+            display._set_window(self.x + x0, self.y + y0,
+                                self.x + x1, self.y + y1)
+            for y in range(y0, y1 + 1):
+                display._writepixels(line[0:self._expand_row(y, x0, x1)])
+        self._dirty = []
+
+
+class BandRenderer:
+    '''
+    Display list renderer that composes full frames in a strip buffer. The
+    drawing methods take the same arguments as their ST7796 counterparts and
+    record the primitive; render() rasterizes them one horizontal band at a
+    time and sends each band with a single window, so RAM use is bounded by
+    the band height instead of the frame size.
+    Args:
+        display (ST7796): display to render to
+        band_height (int): rows per band, optional, defaults to BAND_HEIGHT
+    '''
+    def __init__(self, display, band_height=BAND_HEIGHT):
+        self.display = display
+        self.band_height = band_height
+        self._band = Canvas(display, 0, 0, display.width, display.height,
+                            band_height)
+        self._back = None
+        self._items = []
+
+    def _add(self, top, bottom, method, args):
+        self._items.append((top, bottom, method, args))
+
+    def clear(self):
+        '''
+        Remove all recorded primitives.
+        '''
+        self._items = []
+
+    def fill_rect(self, x, y, width, height, color):
+        self._add(y, y + height - 1, Canvas.fill_rect,
+                  (x, y, width, height, color))
+
+    def line(self, x0, y0, x1, y1, color, thickness=1):
+        self._add(min(y0, y1) - thickness, max(y0, y1) + thickness,
+                  Canvas.line, (x0, y0, x1, y1, color, thickness))
+
+    def fill_circle(self, x0, y0, radius, color):
+        self._add(y0 - radius, y0 + radius, Canvas.fill_circle,
+                  (x0, y0, radius, color))
+
+    def fill_polygon(self, points, color):
+        self._add(min(p[1] for p in points), max(p[1] for p in points),
+                  Canvas.fill_polygon, (points, color))
+
+    def text(self, font, text, x0, y0, color=WHITE, background=BLACK):
+        self._add(y0, y0 + font.HEIGHT - 1, Canvas.text,
+                  (font, text, x0, y0, color, background))
+
+    def write(self, font, string, x, y, fg=WHITE, bg=BLACK):
+        self._add(y, y + font.HEIGHT - 1, Canvas.write,
+                  (font, string, x, y, fg, bg))
+
+    def bitmap(self, bitmap, x, y, index=0):
+        self._add(y, y + bitmap.HEIGHT - 1, Canvas.bitmap,
+                  (bitmap, x, y, index))
+
+    def _bands(self):
+        '''
+        Yield the top row and row count of every band to render, skipping
+        bands outside the partial area when partial mode is active.
+        '''
+        height = self._band.height
+        partial = self.display._partial
+        for top in range(0, height, self.band_height):
+            rows = min(self.band_height, height - top)
+            if partial is not None and (
+                    top + rows - 1 < partial[1] or top > partial[3]):
+                continue
+            yield top, rows
+
+    def _render_band(self, band, top, rows, background):
+        '''
+        Rasterize the primitives that overlap a band into its strip buffer
+        and return the strip.
+        '''
+        width = band.width
+        bottom = top + rows - 1
+        band._top = top
+        band.fill_rect(0, top, width, rows, background)
+        for item_top, item_bottom, method, args in self._items:
+            if item_top <= bottom and item_bottom >= top:
+                method(band, *args)
+        band._dirty = []
+        return band._view[0:width * rows * 2]
+
+    def render(self, background=BLACK):
+        '''
+        Rasterize the recorded primitives band by band over background and
+        send every band to the display. In partial mode only the bands that
+        overlap the partial area are rendered.
+        Args:
+            background (int): 565 encoded color behind all primitives
+        '''
+        band = self._band
+        for top, rows in self._bands():
+            strip = self._render_band(band, top, rows, background)
+            self.display.blit_buffer(strip, 0, top, band.width, rows)
+
+    async def flush_async(self, background=BLACK):
+        '''
+        Like render, but double buffered: the next band is rasterized into a
+        second strip while the previous one is sent by a worker thread, and
+        other tasks run while the coroutine waits for the bus. Without
+        thread support the bands are sent in turn, yielding between them.
+        Other tasks may keep drawing on the display; their calls wait until
+        the band being sent has gone out. display.stop_worker() ends the
+        worker thread.
+        Args:
+            background (int): 565 encoded color behind all primitives
+        '''
+        display = self.display
+        if self._back is None:
+            self._back = Canvas(display, 0, 0, display.width, display.height,
+                                self.band_height)
+        bands = (self._band, self._back)
+        n = 0
+        for top, rows in self._bands():
+            band = bands[n & 1]
+            strip = self._render_band(band, top, rows, background)
+            await display._wait_transfer()
+            display._start_transfer(strip, 0, top, band.width, rows)
+            n += 1
+        await display._wait_transfer()
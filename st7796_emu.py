@@ -0,0 +1,319 @@
+'''
+Host side ST7796 emulator. It stands in for the SPI bus and the CS, DC and
+RST pins, so st7796.py runs on a PC without the machine module. The command
+stream is decoded into an RGB565 framebuffer that can be compared pixel for
+pixel or saved as a PPM or PNG image, and the bus traffic is counted.
+
+    import st7796, st7796_emu
+    panel = st7796_emu.Panel()
+    display = st7796.ST7796(panel.spi, panel.cs, panel.dc, panel.rst,
+                            320, 480, 1)
+    display.fill_rect(10, 10, 100, 50, st7796.RED)
+    panel.save_ppm("frame.ppm")
+    print(panel.bytes, panel.commands, panel.transactions)
+'''
+import struct
+
+_CASET = 0x2A
+_RASET = 0x2B
+_RAMWR = 0x2C
+_SWRESET = 0x01
+_VSCRDEF = 0x33
+_MADCTL = 0x36
+_VSCRSADD = 0x37
+_PIXFMT = 0x3A
+
+_ARGS = {_CASET: 4, _RASET: 4, _MADCTL: 1, _PIXFMT: 1, _VSCRDEF: 6,
+         _VSCRSADD: 2}
+
+_MY = 0x80
+_MX = 0x40
+_MV = 0x20
+
+
+class Pin:
+    '''
+    Output pin that tells its panel about level changes.
+    Args:
+        panel (Panel): panel the pin is wired to
+        name (str): 'cs', 'dc' or 'rst'
+    '''
+    OUT = 1
+    IN = 0
+
+    def __init__(self, panel, name):
+        self._panel = panel
+        self._name = name
+        self._value = 1
+
+    def init(self, mode=OUT, value=None):
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        value = 1 if value else 0
+        if value != self._value:
+            self._value = value
+            self._panel._pin_changed(self._name, value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+
+class SPI:
+    '''
+    SPI bus that hands every write to its panel. The data is passed on
+    without a copy, so heap measurements only see the driver's buffers.
+    Args:
+        panel (Panel): panel on the bus
+    '''
+    def __init__(self, panel):
+        self._panel = panel
+
+    def write(self, data):
+        self._panel._receive(data)
+
+
+class Panel:
+    '''
+    Emulated ST7796 panel. The framebuffer holds big-endian RGB565 pixels in
+    the order they are seen on the glass, width columns by height rows, with
+    the panel's mirrored column order applied so the driver's rotation 0
+    comes out upright. CASET, RASET, RAMWR, MADCTL, PIXFMT, VSCRDEF and
+    VSCRSADD are interpreted; other commands are counted and ignored.
+    Args:
+        width (int): native columns, optional, defaults to 320
+        height (int): native rows, optional, defaults to 480
+        decode (bool): store pixel data in the framebuffer, optional,
+            defaults to True; False only counts the traffic, for benchmarks
+    '''
+    def __init__(self, width=320, height=480, decode=True):
+        self.width = width
+        self.height = height
+        self.decode = decode
+        self.framebuffer = bytearray(width * height * 2)
+        self.spi = SPI(self)
+        self.cs = Pin(self, 'cs')
+        self.dc = Pin(self, 'dc')
+        self.rst = Pin(self, 'rst')
+        self.reset_counters()
+        self._reset()
+
+    def reset_counters(self):
+        '''
+        Clear the bus counters: bytes sent, command bytes, CS transactions
+        and pixels written, the last only counted while decoding.
+        '''
+        self.bytes = 0
+        self.commands = 0
+        self.transactions = 0
+        self.pixels = 0
+
+    def _reset(self):
+        '''Return the registers to their power on values.'''
+        self._command = None
+        self._args = None
+        self._columns = (0, self.width - 1)
+        self._rows = (0, self.height - 1)
+        self._madctl = 0
+        self._pixfmt = 0x06
+        self._scroll = (0, self.height, 0)
+        self._start = 0
+        self._col = 0
+        self._row = 0
+        self._acc = 0
+        self._bits = 0
+
+    def _pin_changed(self, name, value):
+        if name == 'cs' and value == 0:
+            self.transactions += 1
+        elif name == 'rst' and value == 0:
+            self._reset()
+
+    def _receive(self, data):
+        if self.cs._value:
+            return
+        self.bytes += len(data)
+        if not self.dc._value:
+            for command in data:
+                self._execute(command)
+            return
+        if self._command == _RAMWR:
+            if self.decode:
+                self._write_pixels(data)
+            return
+        command = self._command
+        need = _ARGS.get(command)
+        if need is None or self._args is None:
+            return
+        args = self._args + bytes(data) if self._args else data
+        if len(args) < need:
+            self._args = bytes(args)
+            return
+        self._args = None
+        if command in (_CASET, _RASET):
+            start, end = struct.unpack(">HH", args[0:4])
+            if command == _CASET:
+                self._columns = (start, end)
+            else:
+                self._rows = (start, end)
+        elif command == _MADCTL:
+            self._madctl = args[0]
+        elif command == _PIXFMT:
+            self._pixfmt = args[0] & 0x07
+        elif command == _VSCRDEF:
+            self._scroll = struct.unpack(">HHH", args[0:6])
+        else:
+            self._start = struct.unpack(">H", args[0:2])[0]
+
+    def _execute(self, command):
+        self.commands += 1
+        self._command = command
+        self._args = b''
+        if command == _RAMWR:
+            self._col = self._columns[0]
+            self._row = self._rows[0]
+            self._acc = 0
+            self._bits = 0
+        elif command == _SWRESET:
+            self._reset()
+
+    def _write_pixels(self, data):
+        '''
+        Decode pixel data in the current format, bit by bit so that a pixel
+        may be split across writes, and store it. The padding nibble after
+        an odd 12 bit pixel stays pending until the next command.
+        '''
+        fmt = self._pixfmt
+        size = 16 if fmt == 0x05 else 12 if fmt == 0x03 else 24
+        acc = self._acc
+        bits = self._bits
+        for byte in data:
+            acc = acc << 8 | byte
+            bits += 8
+            if bits >= size:
+                bits -= size
+                value = acc >> bits
+                acc &= (1 << bits) - 1
+                if size == 16:
+                    color = value
+                elif size == 12:
+                    color = _color444(value)
+                else:
+                    color = ((value >> 19) << 11 | ((value >> 10) & 0x3f) << 5
+                             | (value >> 3) & 0x1f)
+                self._store(color)
+        self._acc = acc
+        self._bits = bits
+
+    def _store(self, color):
+        '''Write one pixel at the address counter and advance it.'''
+        col = self._col
+        row = self._row
+        madctl = self._madctl
+        x, y = (row, col) if madctl & _MV else (col, row)
+        if not madctl & _MX:
+            x = self.width - 1 - x
+        if madctl & _MY:
+            y = self.height - 1 - y
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = (y * self.width + x) * 2
+            self.framebuffer[i] = color >> 8
+            self.framebuffer[i + 1] = color & 0xff
+        self.pixels += 1
+        col += 1
+        if col > self._columns[1]:
+            col = self._columns[0]
+            row += 1
+            if row > self._rows[1]:
+                row = self._rows[0]
+        self._col = col
+        self._row = row
+
+    def _visible_row(self, y):
+        '''Return the memory row shown on glass row y with scrolling applied.'''
+        tfa, vsa, bfa = self._scroll
+        if tfa <= y < tfa + vsa:
+            return tfa + (y - tfa + self._start - tfa) % vsa
+        return y
+
+    def pixel(self, x, y):
+        '''
+        Return the 565 encoded color shown at a glass position.
+        Args:
+            x (int): column
+            y (int): row
+        '''
+        i = (self._visible_row(y) * self.width + x) * 2
+        return self.framebuffer[i] << 8 | self.framebuffer[i + 1]
+
+    def rgb(self):
+        '''
+        Return the visible image as 8 bit RGB bytes, row by row.
+        '''
+        width = self.width
+        out = bytearray(width * self.height * 3)
+        o = 0
+        fb = self.framebuffer
+        for y in range(self.height):
+            i = self._visible_row(y) * width * 2
+            for _ in range(width):
+                color = fb[i] << 8 | fb[i + 1]
+                red = (color >> 11) & 0x1f
+                green = (color >> 5) & 0x3f
+                blue = color & 0x1f
+                out[o] = red << 3 | red >> 2
+                out[o + 1] = green << 2 | green >> 4
+                out[o + 2] = blue << 3 | blue >> 2
+                o += 3
+                i += 2
+        return out
+
+    def save_ppm(self, path):
+        '''
+        Save the visible image as a binary PPM file.
+        Args:
+            path (str): file name
+        '''
+        with open(path, "wb") as f:
+            f.write(b"P6\n%d %d\n255\n" % (self.width, self.height))
+            f.write(self.rgb())
+
+    def save_png(self, path):
+        '''
+        Save the visible image as a PNG file.
+        Args:
+            path (str): file name
+        '''
+        import zlib
+        rgb = self.rgb()
+        row = self.width * 3
+        raw = bytearray()
+        for i in range(0, len(rgb), row):
+            raw.append(0)
+            raw += rgb[i:i + row]
+
+        def chunk(kind, data):
+            return (struct.pack(">I", len(data)) + kind + data
+                    + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(chunk(b"IHDR", struct.pack(
+                ">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)))
+            f.write(chunk(b"IDAT", zlib.compress(bytes(raw))))
+            f.write(chunk(b"IEND", b""))
+
+
+def _color444(color):
+    '''Expand a 12 bit 444 color to 565.'''
+    red = color >> 8
+    green = (color >> 4) & 0x0f
+    blue = color & 0x0f
+    return ((red << 1 | red >> 3) << 11 | (green << 2 | green >> 2) << 5
+            | (blue << 1 | blue >> 3))
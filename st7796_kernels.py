@@ -0,0 +1,264 @@
+'''
+Hot inner loops of the st7796 driver: 1bpp and palette expansion through
+lookup tables, fill pattern replication, run (span) generation and the
+conversion of RGB565 pixels to the 12 and 18 bit color modes.
+
+Each kernel has a pure Python version here. On MicroPython ports with native
+code emitters st7796_native adds @micropython.native and @micropython.viper
+versions. At import the viper, native and pure Python variants are tried in
+that order, and the first whose output on a fixed test vector matches the
+pure Python kernel is exported under the kernel's name. test_kernels.py
+checks every variant in more depth.
+'''
+
+
+def expand_bytes(dest, i, src, start, count, lut):
+    '''
+    Expand count whole bytes of a 1bpp bitmap starting at src[start] into
+    RGB565 pixels at dest[i] using a 16 bytes per entry expansion table.
+    '''
+    for j in range(start, start + count):
+        e = src[j] << 4
+        dest[i:i + 16] = lut[e:e + 16]
+        i += 16
+
+
+def expand_bits(dest, i, src, bit, count, lut):
+    '''
+    Expand count pixels of a 1bpp bit stream starting at an arbitrary bit
+    offset into RGB565 pixels at dest[i], eight pixels per table lookup.
+    '''
+    while count > 0:
+        n = 8 if count > 8 else count
+        j = bit >> 3
+        shift = bit & 7
+        byte = src[j]
+        if shift:
+            byte = (byte << shift) & 0xff
+            if shift + n > 8:
+                byte |= src[j + 1] >> (8 - shift)
+        e = byte << 4
+        n2 = n * 2
+        dest[i:i + n2] = lut[e:e + n2]
+        i += n2
+        bit += n
+        count -= n
+
+
+def expand_indices(dest, i, src, bit, count, lut, bpp):
+    '''
+    Expand count pixels of a 1, 2, 4 or 8 bpp palette index stream starting
+    at a bit offset that is a multiple of bpp into RGB565 pixels at dest[i],
+    one source byte per table lookup.
+    '''
+    per = 8 // bpp
+    size = 16 // bpp
+    while count > 0:
+        n = per if count > per else count
+        j = bit >> 3
+        shift = bit & 7
+        byte = src[j]
+        if shift:
+            byte = (byte << shift) & 0xff
+            if shift + n * bpp > 8:
+                byte |= src[j + 1] >> (8 - shift)
+        e = byte * size
+        n2 = n * 2
+        dest[i:i + n2] = lut[e:e + n2]
+        i += n2
+        bit += n * bpp
+        count -= n
+
+
+def expand_indices_bitwise(dest, i, src, bit, count, palette, bpp):
+    '''
+    Expand count palette indexes of any depth up to 8 bits, read bit by bit
+    from a bit offset of src, into RGB565 pixels at dest[i]. Used for the
+    depths that do not divide a byte, which expansion tables can not hold.
+    '''
+    for _ in range(count):
+        index = 0
+        for _ in range(bpp):
+            index = index << 1 | (src[bit >> 3] >> (7 - (bit & 7))) & 1
+            bit += 1
+        color = palette[index]
+        dest[i] = color >> 8
+        dest[i + 1] = color & 0xff
+        i += 2
+
+
+def replicate(buf, unit, size):
+    '''
+    Repeat the first unit bytes of buf up to size bytes, doubling the copied
+    block each step.
+    '''
+    n = unit
+    while n < size:
+        count = n if n < size - n else size - n
+        buf[n:n + count] = buf[0:count]
+        n += count
+
+
+def bit_runs(src, bit, width, runs):
+    '''
+    Find the runs of set bits among width bits of src starting at a bit
+    offset, store their start and length pairs in runs and return the
+    number of runs.
+    '''
+    n = 0
+    col = 0
+    while col < width:
+        b = bit + col
+        if src[b >> 3] & (0x80 >> (b & 7)):
+            start = col
+            col += 1
+            b += 1
+            while col < width and src[b >> 3] & (0x80 >> (b & 7)):
+                col += 1
+                b += 1
+            runs[n] = start
+            runs[n + 1] = col - start
+            n += 2
+        col += 1
+    return n >> 1
+
+
+def pack444(dest, o, src, i, pairs):
+    '''
+    Convert pairs of big-endian RGB565 pixels starting at src[i] to 12 bit
+    444 color, two pixels in three bytes, at dest[o].
+    '''
+    for _ in range(pairs):
+        a = src[i] << 8 | src[i + 1]
+        b = src[i + 2] << 8 | src[i + 3]
+        dest[o] = (a >> 8) & 0xf0 | (a >> 7) & 0x0f
+        dest[o + 1] = (a << 3) & 0xf0 | b >> 12
+        dest[o + 2] = (b >> 3) & 0xf0 | (b >> 1) & 0x0f
+        o += 3
+        i += 4
+
+
+def pack666(dest, o, src, i, count):
+    '''
+    Convert count big-endian RGB565 pixels starting at src[i] to 18 bit
+    666 color, three bytes per pixel, at dest[o].
+    '''
+    for _ in range(count):
+        hi = src[i]
+        lo = src[i + 1]
+        dest[o] = hi & 0xf8
+        dest[o + 1] = (hi << 5 | lo >> 3) & 0xfc
+        dest[o + 2] = (lo << 3) & 0xf8
+        o += 3
+        i += 2
+
+
+def _vectors():
+    '''
+    Return the source bytes and expansion table shared by the test vectors
+    of every kernel.
+    '''
+    src = bytes((n * 37 + 11) & 0xff for n in range(64))
+    lut = bytearray(4096)
+    for n in range(4096):
+        lut[n] = (n * 7 + (n >> 8)) & 0xff
+    return src, memoryview(lut)
+
+
+def _run(name, kernel, src, lut):
+    '''
+    Run a kernel variant over the test vectors of its kernel and return
+    everything it produced.
+    '''
+    out = []
+    if name == 'expand_bytes':
+        dest = bytearray(16 * 9 + 4)
+        kernel(dest, 4, src, 3, 9, lut)
+        out.append(bytes(dest))
+    elif name == 'expand_bits':
+        for bit, count in ((0, 16), (3, 13), (5, 1), (7, 9), (12, 27)):
+            dest = bytearray(count * 2 + 2)
+            kernel(dest, 2, src, bit, count, lut)
+            out.append(bytes(dest))
+    elif name == 'expand_indices':
+        for bpp in (1, 2, 4, 8):
+            for start, count in ((0, 17), (1, 9), (3, 1), (5, 12)):
+                dest = bytearray(count * 2 + 2)
+                kernel(dest, 2, src, start * bpp, count, lut, bpp)
+                out.append(bytes(dest))
+    elif name == 'expand_indices_bitwise':
+        palette = [lut[n] << 8 | lut[n + 1] for n in range(0, 512, 2)]
+        for bpp in (3, 5, 7):
+            for start, count in ((0, 11), (3, 5)):
+                dest = bytearray(count * 2 + 2)
+                kernel(dest, 2, src, start * bpp, count, palette, bpp)
+                out.append(bytes(dest))
+    elif name == 'replicate':
+        for unit in (2, 3):
+            buf = bytearray(97)
+            buf[0:unit] = src[0:unit]
+            kernel(memoryview(buf), unit, 95)
+            out.append(bytes(buf))
+    elif name == 'bit_runs':
+        for bit, width in ((0, 24), (3, 17), (13, 1), (6, 40)):
+            runs = bytearray(width + 1)
+            n = kernel(src, bit, width, runs)
+            out.append((n, bytes(runs)))
+    elif name in ('pack444', 'pack666'):
+        for o, i, count in ((0, 0, 1), (3, 2, 7), (1, 10, 12)):
+            dest = bytearray(o + count * 3)
+            kernel(dest, o, src, i, count)
+            out.append(bytes(dest))
+    return out
+
+
+def _select(name, variants, src, lut):
+    '''
+    Return the last added variant, viper before native, whose output
+    matches the first, pure Python, one.
+    '''
+    reference = _run(name, variants[0], src, lut)
+    for kernel in variants[:0:-1]:
+        try:
+            if _run(name, kernel, src, lut) == reference:
+                return kernel
+        except Exception:
+            pass
+    return variants[0]
+
+
+VARIANTS = {
+    'expand_bytes': [expand_bytes],
+    'expand_bits': [expand_bits],
+    'expand_indices': [expand_indices],
+    'expand_indices_bitwise': [expand_indices_bitwise],
+    'replicate': [replicate],
+    'bit_runs': [bit_runs],
+    'pack444': [pack444],
+    'pack666': [pack666],
+}
+
+try:
+    import st7796_native
+except (ImportError, SyntaxError):
+    st7796_native = None
+
+if st7796_native is not None:
+    for _name, _variants in VARIANTS.items():
+        for _suffix in ('_native', '_viper'):
+            _kernel = getattr(st7796_native, _name + _suffix, None)
+            if _kernel is not None:
+                _variants.append(_kernel)
+    _src, _lut = _vectors()
+    expand_bytes = _select('expand_bytes', VARIANTS['expand_bytes'], _src, _lut)
+    expand_bits = _select('expand_bits', VARIANTS['expand_bits'], _src, _lut)
+    expand_indices = _select('expand_indices', VARIANTS['expand_indices'],
+                             _src, _lut)
+    expand_indices_bitwise = _select(
+        'expand_indices_bitwise', VARIANTS['expand_indices_bitwise'], _src,
+        _lut)
+    replicate = _select('replicate', VARIANTS['replicate'], _src, _lut)
+    bit_runs = _select('bit_runs', VARIANTS['bit_runs'], _src, _lut)
+    pack444 = _select('pack444', VARIANTS['pack444'], _src, _lut)
+    pack666 = _select('pack666', VARIANTS['pack666'], _src, _lut)
+    del _src, _lut
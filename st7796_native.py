@@ -0,0 +1,256 @@
+'''
+@micropython.native and @micropython.viper variants of the st7796_kernels
+kernels, with the same arguments and results. This module only compiles on
+MicroPython ports with native code emitters; st7796_kernels uses a variant
+only when its output matches the pure Python kernel.
+
+Viper functions take at most four arguments, so each viper kernel is called
+through a small wrapper that slices the buffers to their start offsets and
+packs the remaining integers into one.
+'''
+import micropython
+
+
+@micropython.native
+def expand_bytes_native(dest, i, src, start, count, lut):
+    for j in range(start, start + count):
+        e = src[j] << 4
+        dest[i:i + 16] = lut[e:e + 16]
+        i += 16
+
+
+@micropython.native
+def expand_bits_native(dest, i, src, bit, count, lut):
+    while count > 0:
+        n = 8 if count > 8 else count
+        j = bit >> 3
+        shift = bit & 7
+        byte = src[j]
+        if shift:
+            byte = (byte << shift) & 0xff
+            if shift + n > 8:
+                byte |= src[j + 1] >> (8 - shift)
+        e = byte << 4
+        n2 = n * 2
+        dest[i:i + n2] = lut[e:e + n2]
+        i += n2
+        bit += n
+        count -= n
+
+
+@micropython.native
+def expand_indices_native(dest, i, src, bit, count, lut, bpp):
+    per = 8 // bpp
+    size = 16 // bpp
+    while count > 0:
+        n = per if count > per else count
+        j = bit >> 3
+        shift = bit & 7
+        byte = src[j]
+        if shift:
+            byte = (byte << shift) & 0xff
+            if shift + n * bpp > 8:
+                byte |= src[j + 1] >> (8 - shift)
+        e = byte * size
+        n2 = n * 2
+        dest[i:i + n2] = lut[e:e + n2]
+        i += n2
+        bit += n * bpp
+        count -= n
+
+
+@micropython.native
+def expand_indices_bitwise_native(dest, i, src, bit, count, palette, bpp):
+    for _ in range(count):
+        index = 0
+        for _ in range(bpp):
+            index = index << 1 | (src[bit >> 3] >> (7 - (bit & 7))) & 1
+            bit += 1
+        color = palette[index]
+        dest[i] = color >> 8
+        dest[i + 1] = color & 0xff
+        i += 2
+
+
+@micropython.native
+def replicate_native(buf, unit, size):
+    n = unit
+    while n < size:
+        count = n if n < size - n else size - n
+        buf[n:n + count] = buf[0:count]
+        n += count
+
+
+@micropython.native
+def bit_runs_native(src, bit, width, runs):
+    n = 0
+    col = 0
+    while col < width:
+        b = bit + col
+        if src[b >> 3] & (0x80 >> (b & 7)):
+            start = col
+            col += 1
+            b += 1
+            while col < width and src[b >> 3] & (0x80 >> (b & 7)):
+                col += 1
+                b += 1
+            runs[n] = start
+            runs[n + 1] = col - start
+            n += 2
+        col += 1
+    return n >> 1
+
+
+@micropython.viper
+def _expand_bytes(dest, src, lut, count: int):
+    d = ptr8(dest)
+    s = ptr8(src)
+    t = ptr8(lut)
+    o = 0
+    for j in range(count):
+        e = s[j] << 4
+        for k in range(16):
+            d[o + k] = t[e + k]
+        o += 16
+
+
+def expand_bytes_viper(dest, i, src, start, count, lut):
+    _expand_bytes(memoryview(dest)[i:], memoryview(src)[start:], lut, count)
+
+
+@micropython.viper
+def _expand_indices(dest, src, lut, packed: int):
+    d = ptr8(dest)
+    s = ptr8(src)
+    t = ptr8(lut)
+    count = packed >> 7
+    bpp = (packed >> 3) & 0x0f
+    shift = packed & 7
+    per = 8 // bpp
+    size = 16 // bpp
+    o = 0
+    j = 0
+    while count > 0:
+        n = count
+        if n > per:
+            n = per
+        byte = s[j]
+        if shift:
+            byte = (byte << shift) & 0xff
+            if shift + n * bpp > 8:
+                byte |= s[j + 1] >> (8 - shift)
+        e = byte * size
+        for k in range(n * 2):
+            d[o + k] = t[e + k]
+        o += n * 2
+        j += 1
+        count -= n
+
+
+def expand_bits_viper(dest, i, src, bit, count, lut):
+    _expand_indices(memoryview(dest)[i:], memoryview(src)[bit >> 3:], lut,
+                    count << 7 | 1 << 3 | (bit & 7))
+
+
+def expand_indices_viper(dest, i, src, bit, count, lut, bpp):
+    _expand_indices(memoryview(dest)[i:], memoryview(src)[bit >> 3:], lut,
+                    count << 7 | bpp << 3 | (bit & 7))
+
+
+@micropython.viper
+def replicate_viper(buf, unit: int, size: int):
+    b = ptr8(buf)
+    for n in range(unit, size):
+        b[n] = b[n - unit]
+
+
+@micropython.viper
+def _bit_runs(src, runs, packed: int) -> int:
+    s = ptr8(src)
+    r = ptr8(runs)
+    width = packed >> 3
+    bit = packed & 7
+    n = 0
+    col = 0
+    while col < width:
+        b = bit + col
+        if s[b >> 3] & (0x80 >> (b & 7)):
+            start = col
+            col += 1
+            b += 1
+            while col < width and s[b >> 3] & (0x80 >> (b & 7)):
+                col += 1
+                b += 1
+            r[n] = start
+            r[n + 1] = col - start
+            n += 2
+        col += 1
+    return n >> 1
+
+
+def bit_runs_viper(src, bit, width, runs):
+    return _bit_runs(memoryview(src)[bit >> 3:], runs, width << 3 | (bit & 7))
+
+
+@micropython.native
+def pack444_native(dest, o, src, i, pairs):
+    for _ in range(pairs):
+        a = src[i] << 8 | src[i + 1]
+        b = src[i + 2] << 8 | src[i + 3]
+        dest[o] = (a >> 8) & 0xf0 | (a >> 7) & 0x0f
+        dest[o + 1] = (a << 3) & 0xf0 | b >> 12
+        dest[o + 2] = (b >> 3) & 0xf0 | (b >> 1) & 0x0f
+        o += 3
+        i += 4
+
+
+@micropython.native
+def pack666_native(dest, o, src, i, count):
+    for _ in range(count):
+        hi = src[i]
+        lo = src[i + 1]
+        dest[o] = hi & 0xf8
+        dest[o + 1] = (hi << 5 | lo >> 3) & 0xfc
+        dest[o + 2] = (lo << 3) & 0xf8
+        o += 3
+        i += 2
+
+
+@micropython.viper
+def _pack444(dest, src, pairs: int):
+    d = ptr8(dest)
+    s = ptr8(src)
+    o = 0
+    i = 0
+    for _ in range(pairs):
+        a = s[i] << 8 | s[i + 1]
+        b = s[i + 2] << 8 | s[i + 3]
+        d[o] = (a >> 8) & 0xf0 | (a >> 7) & 0x0f
+        d[o + 1] = (a << 3) & 0xf0 | b >> 12
+        d[o + 2] = (b >> 3) & 0xf0 | (b >> 1) & 0x0f
+        o += 3
+        i += 4
+
+
+def pack444_viper(dest, o, src, i, pairs):
+    _pack444(memoryview(dest)[o:], memoryview(src)[i:], pairs)
+
+
+@micropython.viper
+def _pack666(dest, src, count: int):
+    d = ptr8(dest)
+    s = ptr8(src)
+    o = 0
+    i = 0
+    for _ in range(count):
+        hi = s[i]
+        lo = s[i + 1]
+        d[o] = hi & 0xf8
+        d[o + 1] = (hi << 5 | lo >> 3) & 0xfc
+        d[o + 2] = (lo << 3) & 0xf8
+        o += 3
+        i += 2
+
+
+def pack666_viper(dest, o, src, i, count):
+    _pack666(memoryview(dest)[o:], memoryview(src)[i:], count)
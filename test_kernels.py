@@ -0,0 +1,169 @@
+'''
+Check every variant of the st7796_kernels kernels against straightforward
+pixel by pixel versions. Runs under pytest on a PC, or on the board with
+
+    import test_kernels
+    test_kernels.run()
+
+where the native and viper variants of st7796_native are included.
+'''
+import st7796_kernels
+
+SRC = bytes((n * 37 + 11) & 0xff for n in range(64))
+PALETTE = [(n * 2731 + 17) & 0xffff for n in range(256)]
+
+
+def _bit(src, bit):
+    return (src[bit >> 3] >> (7 - (bit & 7))) & 1
+
+
+def _pixels(colors):
+    out = bytearray()
+    for color in colors:
+        out.append(color >> 8)
+        out.append(color & 0xff)
+    return bytes(out)
+
+
+def _table(bpp):
+    '''Expansion table of one byte of bpp bit indexes into PALETTE colors.'''
+    per = 8 // bpp
+    mask = (1 << bpp) - 1
+    table = bytearray(4096)
+    for byte in range(256):
+        colors = [PALETTE[(byte >> (8 - bpp * (k + 1))) & mask]
+                  for k in range(per)]
+        table[byte * per * 2:(byte + 1) * per * 2] = _pixels(colors)
+    return memoryview(table)
+
+
+def _variants(name):
+    return st7796_kernels.VARIANTS[name]
+
+
+def test_expand_bytes():
+    lut = _table(1)
+    for kernel in _variants('expand_bytes'):
+        for start, count in ((0, 1), (3, 9), (60, 4)):
+            dest = bytearray(count * 16 + 4)
+            kernel(dest, 4, SRC, start, count, lut)
+            expected = _pixels(PALETTE[_bit(SRC, bit)]
+                               for bit in range(start * 8, (start + count) * 8))
+            assert dest[4:] == expected, kernel.__name__
+
+
+def test_expand_bits():
+    lut = _table(1)
+    for kernel in _variants('expand_bits'):
+        for bit, count in ((0, 16), (3, 13), (5, 1), (7, 9), (12, 27),
+                           (1, 100)):
+            dest = bytearray(count * 2 + 2)
+            kernel(dest, 2, SRC, bit, count, lut)
+            expected = _pixels(PALETTE[_bit(SRC, b)]
+                               for b in range(bit, bit + count))
+            assert dest[2:] == expected, (kernel.__name__, bit, count)
+
+
+def test_expand_indices():
+    for bpp in (1, 2, 4, 8):
+        lut = _table(bpp)
+        for kernel in _variants('expand_indices'):
+            for start, count in ((0, 17), (1, 9), (3, 1), (5, 12), (0, 40)):
+                dest = bytearray(count * 2 + 2)
+                kernel(dest, 2, SRC, start * bpp, count, lut, bpp)
+                colors = []
+                for n in range(start, start + count):
+                    index = 0
+                    for b in range(n * bpp, (n + 1) * bpp):
+                        index = index << 1 | _bit(SRC, b)
+                    colors.append(PALETTE[index])
+                assert dest[2:] == _pixels(colors), (kernel.__name__, bpp,
+                                                     start, count)
+
+
+def test_expand_indices_bitwise():
+    for kernel in _variants('expand_indices_bitwise'):
+        for bpp in range(1, 9):
+            for start, count in ((0, 17), (1, 9), (3, 1), (5, 12)):
+                dest = bytearray(count * 2 + 2)
+                kernel(dest, 2, SRC, start * bpp, count, PALETTE, bpp)
+                colors = []
+                for n in range(start, start + count):
+                    index = 0
+                    for b in range(n * bpp, (n + 1) * bpp):
+                        index = index << 1 | _bit(SRC, b)
+                    colors.append(PALETTE[index])
+                assert dest[2:] == _pixels(colors), (kernel.__name__, bpp,
+                                                     start, count)
+
+
+def test_replicate():
+    for kernel in _variants('replicate'):
+        for unit, size in ((2, 95), (3, 95), (3, 3), (2, 1024)):
+            buf = bytearray(size + 2)
+            buf[0:unit] = SRC[0:unit]
+            kernel(memoryview(buf), unit, size)
+            expected = bytes(SRC[n % unit] for n in range(size)) + b'\0\0'
+            assert buf == expected, (kernel.__name__, unit, size)
+
+
+def test_bit_runs():
+    for kernel in _variants('bit_runs'):
+        for bit, width in ((0, 24), (3, 17), (13, 1), (6, 40), (0, 200)):
+            runs = bytearray(width + 1)
+            n = kernel(SRC, bit, width, runs)
+            expected = []
+            col = 0
+            while col < width:
+                if _bit(SRC, bit + col):
+                    start = col
+                    while col < width and _bit(SRC, bit + col):
+                        col += 1
+                    expected += [start, col - start]
+                col += 1
+            assert n * 2 == len(expected), (kernel.__name__, bit, width)
+            assert list(runs[0:n * 2]) == expected, (kernel.__name__, bit,
+                                                     width)
+
+
+def test_pack444():
+    for kernel in _variants('pack444'):
+        for o, i, pairs in ((0, 0, 1), (3, 2, 7), (1, 10, 12)):
+            dest = bytearray(o + pairs * 3)
+            kernel(dest, o, SRC, i, pairs)
+            nibbles = []
+            for n in range(i, i + pairs * 4, 2):
+                color = SRC[n] << 8 | SRC[n + 1]
+                nibbles += [color >> 12, (color >> 7) & 0x0f,
+                            (color >> 1) & 0x0f]
+            expected = bytes(nibbles[n] << 4 | nibbles[n + 1]
+                             for n in range(0, len(nibbles), 2))
+            assert dest[o:] == expected, (kernel.__name__, o, i, pairs)
+
+
+def test_pack666():
+    for kernel in _variants('pack666'):
+        for o, i, count in ((0, 0, 1), (3, 2, 7), (1, 10, 12)):
+            dest = bytearray(o + count * 3)
+            kernel(dest, o, SRC, i, count)
+            expected = bytearray()
+            for n in range(i, i + count * 2, 2):
+                color = SRC[n] << 8 | SRC[n + 1]
+                expected += bytes(((color >> 11) << 3,
+                                   ((color >> 5) & 0x3f) << 2,
+                                   (color & 0x1f) << 3))
+            assert dest[o:] == expected, (kernel.__name__, o, i, count)
+
+
+def run():
+    '''Run every test and print the kernel variants that were checked.'''
+    for name in sorted(globals()):
+        if name.startswith('test_'):
+            globals()[name]()
+    for name, variants in st7796_kernels.VARIANTS.items():
+        print(name, ' '.join(kernel.__name__ for kernel in variants))
+    print('ok')
+
+
+if __name__ == '__main__':
+    run()